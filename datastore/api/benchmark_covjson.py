@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# Benchmark of building CoverageJSON from a GetObsResponse, without a running datastore.
+# Run from this directory (after generating the protobuf code) with e.g.:
+#   python benchmark_covjson.py --stations 55 --parameters 44 --times 144
+import argparse
+import math
+import random
+from datetime import timezone
+from itertools import groupby
+from time import perf_counter
+
+import covjson
+import datastore_pb2 as dstore
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
+
+
+def create_response(stations, parameters, times, nan_fraction):
+    response = dstore.GetObsResponse()
+    for s in range(stations):
+        lat, lon = 50.0 + s * 0.1, 3.0 + s * 0.1
+        for p in range(parameters):
+            md = response.observations.add()
+            md.ts_mdata.platform = f"{s:05d}"
+            md.ts_mdata.instrument = f"param{p:02d}"
+            md.ts_mdata.unit = "unit"
+            all_nan = random.random() < nan_fraction  # Stations that don't have a parameter give them all as nan
+            for t in range(times):
+                obs = md.obs_mdata.add()
+                obs.geo_point.lat = lat
+                obs.geo_point.lon = lon
+                obs.obstime_instant.seconds = 1672444800 + t * 600
+                obs.value = "nan" if all_nan else str(round(random.uniform(-10, 30), 1))
+    return response
+
+
+def per_observation_collect(response):
+    """The conversion as done before the columnar path: per observation tuples and NaN scans."""
+    data = []
+    for md in response.observations:
+        tuples = ((o.obstime_instant.ToDatetime(tzinfo=timezone.utc), float(o.value)) for o in md.obs_mdata)
+        (times, values) = zip(*tuples)
+        lat, lon = md.obs_mdata[0].geo_point.lat, md.obs_mdata[0].geo_point.lon
+        data.append(((lat, lon, times), md.ts_mdata.instrument, md.ts_mdata.unit, values))
+    data.sort(key=lambda x: (x[0], x[1]))
+    for _, group in groupby(data, lambda x: x[0]):
+        for _, _, _, values in group:
+            if all(math.isnan(v) for v in values):
+                continue
+            [v if not math.isnan(v) else None for v in values]
+
+
+def columnar_collect(response):
+    for data in covjson.collect_data(response):
+        covjson.format_times(data.times)
+        for series in data.series:
+            if not series.nan_mask.all():
+                covjson.values_without_nan(series)
+
+
+def pydantic_serialize(response):
+    """Roughly what FastAPI does for a returned model: validate, encode to JSON-compatible data and dump."""
+    model = covjson.make_covjson(covjson.group_observations(response))
+    return JSONResponse(jsonable_encoder(model, exclude_none=True)).body
+
+
+def fast_serialize(response):
+    return ORJSONResponse(covjson.make_covjson_dict(covjson.group_observations(response))).body
+
+
+def best_of(repeat, f, *args):
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        f(*args)
+        timings.append(perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--stations", type=int, default=55)
+    parser.add_argument("--parameters", type=int, default=44)
+    parser.add_argument("--times", type=int, default=144)
+    parser.add_argument("--nan-fraction", type=float, default=0.1, help="fraction of all-nan time series")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    response = create_response(args.stations, args.parameters, args.times, args.nan_fraction)
+    print(f"{args.stations * args.parameters * args.times} observations in {len(response.observations)} time series")
+
+    old = best_of(args.repeat, per_observation_collect, response)
+    new = best_of(args.repeat, columnar_collect, response)
+    print(f"per observation collect: {old:.3f}s")
+    print(f"columnar collect:        {new:.3f}s ({old / new:.1f}x)")
+
+    old = best_of(args.repeat, pydantic_serialize, response)
+    new = best_of(args.repeat, fast_serialize, response)
+    print(f"pydantic response:       {old:.3f}s ({1 / old:.1f} responses/s)")
+    print(f"orjson response:         {new:.3f}s ({1 / new:.1f} responses/s, {old / new:.1f}x)")
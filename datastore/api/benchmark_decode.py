@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# Benchmark of decoding a serialized GetObsResponse to NumPy arrays per time series, message by message
+# versus a field at a time with dsclient. The response is a day of all stations and parameters from a running
+# datastore (DSHOST/DSPORT), or a serialized GetObsResponse from a file. Run from this directory with e.g.:
+#   PYTHONPATH=.. python benchmark_decode.py --start 2022-12-31T00:00:00+00:00
+import argparse
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from time import perf_counter
+
+import datastore_pb2 as dstore
+import datastore_pb2_grpc as dstore_grpc
+import dsclient
+import numpy as np
+
+
+def per_message(data):
+    """The decoding as done before dsclient.decode_response: parsing, then a loop over the messages per field."""
+    series = []
+    for md in dstore.GetObsResponse.FromString(data).observations:
+        obs_mdata = md.obs_mdata
+        times = np.array([o.obstime_instant.seconds for o in obs_mdata], dtype="datetime64[s]")
+        values = np.array([float(o.value) for o in obs_mdata])
+        positions = sorted({(o.geo_point.lat, o.geo_point.lon) for o in obs_mdata})
+        series.append((md.ts_mdata, times, values, positions))
+    return series
+
+
+def best_of(repeat, decode, response):
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        decode(response)
+        timings.append(perf_counter() - start)
+    return min(timings)
+
+
+def get_response(args):
+    if args.response:
+        with open(args.response, "rb") as file:
+            return file.read()
+    request = dstore.GetObsRequest(interval=dsclient.time_interval(args.start, args.start + timedelta(days=1)))
+    with dsclient.insecure_channel() as channel:
+        return dstore_grpc.DatastoreStub(channel).GetObservations(request).SerializeToString()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--response", help="file with a serialized GetObsResponse, instead of getting it")
+    parser.add_argument(
+        "--start", type=datetime.fromisoformat, default=datetime(2022, 12, 31, tzinfo=timezone.utc), help="UTC"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    data = get_response(args)
+    response = dstore.GetObsResponse.FromString(data)
+    observations = sum(len(md.obs_mdata) for md in response.observations)
+    print(f"{len(response.observations)} time series, {observations} observations, {len(data)} bytes")
+    old = best_of(args.repeat, per_message, data)
+    print(f"per message:            {old:.3f}s ({observations / old:.0f} obs/s)")
+    new = best_of(args.repeat, dsclient.decode_response, data)
+    print(f"columns:                {new:.3f}s ({observations / new:.0f} obs/s, {old / new:.1f}x)")
+    parse = best_of(args.repeat, dstore.GetObsResponse.FromString, data)
+    print(f"of which parsing:       {parse:.3f}s")
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# Benchmark of a many-parameter data query as a single GetObsRequest versus fanned out over concurrent
+# requests, against a running datastore (DSHOST/DSPORT). Run from this directory with e.g.:
+#   PYTHONPATH=.. python benchmark_fan_out.py --platforms "*" \
+#       --parameters dd,ff,rh,pp,tn,tx,td,vv,qg,ww --window-hours 6
+import argparse
+import asyncio
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from time import perf_counter
+
+import datastore_pb2 as dstore
+import grpc_getter
+
+
+async def best_of(repeat, get_obs_request):
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        response = await grpc_getter.fan_out_observations(get_obs_request)
+        timings.append(perf_counter() - start)
+    return min(timings), sum(len(md.obs_mdata) for md in response.observations)
+
+
+async def main(args):
+    grpc_getter.init_channel_pool()
+    interval = dstore.TimeInterval()
+    interval.start.FromDatetime(args.start)
+    interval.end.FromDatetime(args.start + timedelta(hours=args.hours))
+    get_obs_request = dstore.GetObsRequest(
+        platforms=args.platforms.split(","), instruments=args.parameters.split(","), interval=interval
+    )
+
+    grpc_getter.FAN_OUT = False
+    single, observations = await best_of(args.repeat, get_obs_request)
+    print(f"{observations} observations")
+    print(f"single request:   {single:.3f}s")
+
+    grpc_getter.FAN_OUT = True
+    for window_hours in sorted({0, args.window_hours}):
+        grpc_getter.FAN_OUT_WINDOW = timedelta(hours=window_hours)
+        requests = len(grpc_getter.split_request(get_obs_request))
+        fanned_out, _ = await best_of(args.repeat, get_obs_request)
+        print(f"{requests:3d} requests:     {fanned_out:.3f}s ({single / fanned_out:.1f}x)")
+    await grpc_getter.close_channel_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--platforms", default="*")
+    parser.add_argument("--parameters", default="dd,ff,rh,pp,tn,tx,td,vv,qg,ww")
+    parser.add_argument(
+        "--start", type=datetime.fromisoformat, default=datetime(2022, 12, 31, tzinfo=timezone.utc), help="UTC"
+    )
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--window-hours", type=float, default=6, help="also split on time windows of this length")
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
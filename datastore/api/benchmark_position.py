@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# Benchmark of the two ways a position query gets its data from a running datastore (DSHOST/DSPORT): a
+# polygon search around the point, or a platform lookup in the station index. Run from this directory with e.g.:
+#   PYTHONPATH=.. python benchmark_position.py --parameters tn --stations 20
+import argparse
+import asyncio
+import random
+from time import perf_counter
+
+import datastore_pb2 as dstore
+import grpc_getter
+import station_index
+from shapely import buffer
+from shapely import geometry
+
+
+def polygon_request(poly, instruments):
+    points = [dstore.Point(lat=coord[1], lon=coord[0]) for coord in poly.exterior.coords]
+    return dstore.GetObsRequest(instruments=instruments, inside=dstore.Polygon(points=points))
+
+
+async def total_time(requests):
+    start = perf_counter()
+    for request in requests:
+        await grpc_getter.get_observations(request)
+    return perf_counter() - start
+
+
+async def main(args):
+    grpc_getter.init_channel_pool()
+    await station_index.refresh_index()
+    index = station_index.get_index()
+    instruments = args.parameters.split(",")
+    platforms = random.sample(sorted(index.positions), min(args.stations, len(index.positions)))
+
+    polygons = [buffer(geometry.Point(index.positions[platform]), 0.0001, quad_segs=1) for platform in platforms]
+    start = perf_counter()
+    platform_requests = [
+        dstore.GetObsRequest(platforms=index.platforms_in(poly), instruments=instruments) for poly in polygons
+    ]
+    lookup = perf_counter() - start
+    polygon_requests = [polygon_request(poly, instruments) for poly in polygons]
+
+    for _ in range(args.repeat):
+        polygon = await total_time(polygon_requests)
+        platform = await total_time(platform_requests)
+        print(
+            f"{len(platforms)} positions: polygon search {polygon / len(platforms) * 1000:.1f}ms, "
+            f"platform lookup {platform / len(platforms) * 1000:.1f}ms per query "
+            f"(of which {lookup / len(platforms) * 1000:.3f}ms in the index)"
+        )
+    await grpc_getter.close_channel_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--parameters", default="tn")
+    parser.add_argument("--stations", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,241 @@
+from collections import namedtuple
+from typing import Iterator
+
+import numpy as np
+import orjson
+from covjson_pydantic.coverage import Coverage
+from covjson_pydantic.coverage import CoverageCollection
+from covjson_pydantic.domain import Axes
+from covjson_pydantic.domain import Domain
+from covjson_pydantic.domain import DomainType
+from covjson_pydantic.domain import ValuesAxis
+from covjson_pydantic.ndarray import NdArray
+from covjson_pydantic.observed_property import ObservedProperty
+from covjson_pydantic.parameter import Parameter
+from covjson_pydantic.reference_system import ReferenceSystem
+from covjson_pydantic.reference_system import ReferenceSystemConnectionObject
+from covjson_pydantic.unit import Unit
+from dsclient import decode_times
+from dsclient import decode_values
+from dsclient import SeriesArrays
+from fastapi import HTTPException
+from pydantic import AwareDatetime
+
+
+REFERENCING = [
+    {
+        "coordinates": ["y", "x"],
+        "system": {"type": "GeographicCRS", "id": "http://www.opengis.net/def/crs/EPSG/0/4326"},
+    },
+    {
+        "coordinates": ["z"],
+        "system": {"type": "TemporalRS", "calendar": "Gregorian"},
+    },
+]
+
+# The time series (Metadata2 messages of a GetObsResponse, or dsclient.SeriesArrays) sharing a position and
+# time axis, i.e. what ends up in a single coverage
+CoverageGroup = namedtuple("CoverageGroup", ["lat", "lon", "times", "observations"])
+# One time series as columns
+SeriesData = namedtuple("SeriesData", ["param_id", "unit", "values", "nan_mask"])
+# A CoverageGroup with the values of all its time series decoded
+CoverageData = namedtuple("CoverageData", ["lat", "lon", "times", "series"])
+
+
+def group_observations(response) -> list[CoverageGroup]:
+    """Group the time series in a GetObsResponse by position and time axis, see group_series.
+
+    Only the obs times are decoded, the values are left for decode_group.
+    """
+    return _group(
+        # HACK: For now assume they all have the same position
+        (md.obs_mdata[0].geo_point.lat, md.obs_mdata[0].geo_point.lon, decode_times(md.obs_mdata, "ns"), md)
+        for md in response.observations
+        if len(md.obs_mdata) > 0
+    )
+
+
+def group_series(series_list: list[SeriesArrays]) -> list[CoverageGroup]:
+    """Group decoded time series (with times in ns) by position and time axis.
+
+    Groups are sorted on position and time axis, and the series in a group on param_id, to get
+    consistently sorted output.
+    """
+    return _group(
+        # HACK: For now assume they all have the same position
+        (*series.positions[series.position_index[0]].tolist(), series.times, series)
+        for series in series_list
+        if len(series.times) > 0
+    )
+
+
+def _group(series_list) -> list[CoverageGroup]:
+    groups = {}
+    for lat, lon, times, series in series_list:
+        key = (lat, lon, times.tobytes())
+        if key not in groups:
+            groups[key] = CoverageGroup(lat, lon, times, [])
+        groups[key].observations.append(series)
+
+    coverages = sorted(groups.values(), key=lambda c: (c.lat, c.lon, c.times.view(np.int64).tolist()))
+    for coverage in coverages:
+        coverage.observations.sort(key=lambda series: series.ts_mdata.instrument)
+    return coverages
+
+
+def decode_group(group: CoverageGroup) -> CoverageData:
+    series = []
+    for s in group.observations:
+        values = s.values if isinstance(s, SeriesArrays) else decode_values(s.obs_mdata)
+        series.append(SeriesData(s.ts_mdata.instrument, s.ts_mdata.unit, values, np.isnan(values)))
+    return CoverageData(group.lat, group.lon, group.times, series)
+
+
+def collect_data(response) -> list[CoverageData]:
+    return [decode_group(group) for group in group_observations(response)]
+
+
+def format_times(times) -> list[str]:
+    # Only use sub-second precision when needed, the same way pydantic serializes datetimes
+    unit = "s" if not (times.view(np.int64) % 1_000_000_000).any() else "us"
+    return np.datetime_as_string(times, unit=unit, timezone="UTC").tolist()
+
+
+def values_without_nan(series: SeriesData) -> list:
+    values = series.values.tolist()
+    for i in np.flatnonzero(series.nan_mask).tolist():
+        values[i] = None
+    return values
+
+
+def make_coverage(data: CoverageData) -> Coverage:
+    referencing = [
+        ReferenceSystemConnectionObject(
+            coordinates=["y", "x"],
+            system=ReferenceSystem(type="GeographicCRS", id="http://www.opengis.net/def/crs/EPSG/0/4326"),
+        ),
+        ReferenceSystemConnectionObject(
+            coordinates=["z"],
+            system=ReferenceSystem(type="TemporalRS", calendar="Gregorian"),
+        ),
+    ]
+    domain = Domain(
+        domainType=DomainType.point_series,
+        axes=Axes(
+            x=ValuesAxis[float](values=[data.lon]),
+            y=ValuesAxis[float](values=[data.lat]),
+            t=ValuesAxis[AwareDatetime](values=format_times(data.times)),
+        ),
+        referencing=referencing,
+    )
+
+    parameters = {}
+    ranges = {}
+    for series in data.series:
+        if series.nan_mask.all():
+            continue  # Drop ranges if completely nan.
+            # TODO: Drop the whole coverage if it becomes empty?
+        values_no_nan = values_without_nan(series)
+        # TODO: Improve this based on "standard name", etc.
+        parameters[series.param_id] = Parameter(
+            observedProperty=ObservedProperty(label={"en": series.param_id}), unit=Unit(label={"en": series.unit})
+        )  # TODO: Also fill symbol?
+        ranges[series.param_id] = NdArray(
+            values=values_no_nan, axisNames=["t", "y", "x"], shape=[len(values_no_nan), 1, 1]
+        )
+
+    return Coverage(domain=domain, parameters=parameters, ranges=ranges)
+
+
+def make_coverage_dict(data: CoverageData) -> dict:
+    """Same as make_coverage, but as plain dicts (the JSON document) without any pydantic validation.
+
+    The values are kept as NumPy arrays, with NaN values serialized as null by orjson.
+    """
+    parameters = {}
+    ranges = {}
+    for series in data.series:
+        if series.nan_mask.all():
+            continue  # Drop ranges if completely nan.
+        parameters[series.param_id] = {
+            "type": "Parameter",
+            "observedProperty": {"label": {"en": series.param_id}},
+            "unit": {"label": {"en": series.unit}},
+        }
+        ranges[series.param_id] = {
+            "type": "NdArray",
+            "dataType": "float",
+            "axisNames": ["t", "y", "x"],
+            "shape": [len(series.values), 1, 1],
+            "values": series.values,
+        }
+
+    return {
+        "type": "Coverage",
+        "domain": {
+            "type": "Domain",
+            "domainType": "PointSeries",
+            "axes": {
+                "x": {"values": [data.lon]},
+                "y": {"values": [data.lat]},
+                "t": {"values": format_times(data.times)},
+            },
+            "referencing": REFERENCING,
+        },
+        "parameters": parameters,
+        "ranges": ranges,
+    }
+
+
+def no_data_found():
+    return HTTPException(status_code=404, detail="No data found")
+
+
+def make_covjson_dict(groups: list[CoverageGroup]) -> dict:
+    """Same as make_covjson, but as plain dicts that can be serialized directly with orjson."""
+    coverages = [make_coverage_dict(decode_group(group)) for group in groups]
+
+    if len(coverages) == 0:
+        raise no_data_found()
+    elif len(coverages) == 1:
+        return coverages[0]
+    else:
+        # HACK to take parameters from first one
+        return {"type": "CoverageCollection", "coverages": coverages, "parameters": coverages[0]["parameters"]}
+
+
+def stream_covjson_collection(groups: list[CoverageGroup]) -> Iterator[bytes]:
+    """Serialize a CoverageCollection one coverage at a time.
+
+    Each coverage is decoded, built and serialized only when the previous one has been consumed, so at
+    most one coverage is held in memory besides the groups themselves. This only bounds the memory for
+    serialization: the groups hold the whole datastore result, which is fetched and grouped before
+    streaming starts. The output is the same as serializing make_covjson_dict.
+    """
+    if len(groups) == 0:
+        raise no_data_found()  # Raised here already, as the generator below only runs once streaming starts
+
+    def generate():
+        parameters = None
+        yield b'{"type":"CoverageCollection","coverages":['
+        for i, group in enumerate(groups):
+            coverage = make_coverage_dict(decode_group(group))
+            if parameters is None:
+                parameters = coverage["parameters"]  # HACK to take parameters from first one
+            yield (b"," if i > 0 else b"") + orjson.dumps(coverage, option=orjson.OPT_SERIALIZE_NUMPY)
+        yield b'],"parameters":' + orjson.dumps(parameters) + b"}"
+
+    return generate()
+
+
+def make_covjson(groups: list[CoverageGroup]) -> Coverage | CoverageCollection:
+    coverages = [make_coverage(decode_group(group)) for group in groups]
+
+    if len(coverages) == 0:
+        raise no_data_found()
+    elif len(coverages) == 1:
+        return coverages[0]
+    else:
+        return CoverageCollection(
+            coverages=coverages, parameters=coverages[0].parameters
+        )  # HACK to take parameters from first one
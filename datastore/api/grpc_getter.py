@@ -0,0 +1,118 @@
+import logging
+import os
+import threading
+from datetime import datetime
+from datetime import timedelta
+
+import datastore_pb2 as dstore
+import datastore_pb2_grpc as dstore_grpc
+import dsclient
+from dsclient import ChannelPool
+from dsclient import decode_response
+from dsclient import merge_responses
+from starlette.concurrency import run_in_threadpool
+
+
+logger = logging.getLogger(__name__)
+
+# Number of channels (i.e. HTTP/2 connections) to the datastore shared by all requests in a worker
+POOL_SIZE = int(os.getenv("DSPOOLSIZE", "4"))
+# Use grpc.aio channels awaited on the event loop (default), or blocking channels called from the
+# threadpool. The latter is mainly kept around to compare the two under load
+ASYNC_GRPC = (os.getenv("DSASYNC") or "true").lower() == "true"
+# Split data queries into one request per instrument (and time window, if set), sent concurrently
+FAN_OUT = os.getenv("DSFANOUT", "false").lower() == "true"
+# Maximum number of concurrent requests for a single split query
+FAN_OUT_CONCURRENCY = int(os.getenv("DSFANOUTCONCURRENCY", "8"))
+# Length of the time windows to split a query in, 0 to only split by instrument
+FAN_OUT_WINDOW = timedelta(hours=float(os.getenv("DSFANOUTWINDOWHOURS", "0")))
+# Don't split on time if that gives more windows than this, e.g. for open-ended intervals
+FAN_OUT_MAX_WINDOWS = 64
+# Get data queries in time chunks of about DSCHUNKROWS observations, decoding a chunk while the next one is
+# on its way, instead of in a single response. Takes precedence over FAN_OUT
+CHUNKED = os.getenv("DSCHUNKED", "false").lower() == "true"
+# Number of times a call is retried when the datastore is unavailable. Kept low, as the user is waiting
+RETRIES = int(os.getenv("DSAPIRETRIES", "1"))
+
+
+_pool: ChannelPool | None = None
+_pool_lock = threading.Lock()
+
+
+def init_channel_pool() -> ChannelPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ChannelPool(POOL_SIZE, ASYNC_GRPC)
+            mode = "aio" if ASYNC_GRPC else "sync"
+            logger.info(f"Opened {POOL_SIZE} {mode} channel(s) to datastore at {_pool.target}")
+        return _pool
+
+
+async def close_channel_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        logger.info(f"Closing datastore channel pool: {pool.stats()}")
+        await pool.close()
+
+
+def get_pool_stats() -> dict:
+    return _pool.stats() if _pool is not None else {}
+
+
+def get_grpc_stub() -> dstore_grpc.DatastoreStub:
+    # Normally the pool is opened on application startup, but create it on first use otherwise
+    # (e.g. when the app is driven without running the lifespan events)
+    return (_pool or init_channel_pool()).stub()
+
+
+async def call(method_name: str, request):
+    method = getattr(get_grpc_stub(), method_name)
+    if ASYNC_GRPC:
+        return await dsclient.call_with_retries_async(method, request, RETRIES)
+    return await run_in_threadpool(dsclient.call_with_retries, method, request, RETRIES)
+
+
+async def get_observations(get_obs_request):
+    return await call("GetObservations", get_obs_request)
+
+
+def split_request(get_obs_request) -> list:
+    """Split a GetObsRequest by instrument and time window, in time order per instrument."""
+    return dsclient.split_request(get_obs_request, FAN_OUT_WINDOW, FAN_OUT_MAX_WINDOWS)
+
+
+async def fan_out_observations(get_obs_request):
+    """Get observations with a concurrent request per instrument and time window, if FAN_OUT is enabled."""
+    requests = split_request(get_obs_request) if FAN_OUT else [get_obs_request]
+    if len(requests) == 1:
+        return await get_observations(get_obs_request)
+    responses = dsclient.iter_observations(get_observations, requests, FAN_OUT_CONCURRENCY)
+    return merge_responses([response async for response in responses])
+
+
+def _open_ended(interval) -> bool:
+    if not (interval.HasField("start") and interval.HasField("end")):
+        return True
+    # The API gives an open bound ("..") as datetime.min or datetime.max
+    return interval.start.ToDatetime() <= datetime.min or interval.end.ToDatetime() >= datetime.max.replace(
+        microsecond=0
+    )
+
+
+async def get_series(get_obs_request) -> list[dsclient.SeriesArrays]:
+    """Get observations in time chunks, decoded to arrays per time series, see CHUNKED.
+
+    Only the decoded arrays of the chunks are kept, rather than the responses, and decoding happens
+    in the threadpool so the event loop keeps receiving the next chunk in the meantime.
+    """
+    extent = None
+    if _open_ended(get_obs_request.interval):
+        # Chunk over the data that is there, rather than e.g. from year 1 onwards
+        extent = (await call("GetExtents", dstore.GetExtentsRequest())).temporal_extent
+    parts = []
+    async for response in dsclient.iter_chunks_async(get_observations, get_obs_request, extent):
+        parts.append(await run_in_threadpool(decode_response, response, "ns"))
+    return dsclient.concat_series(parts)
@@ -1,3 +1,16 @@
+# Load test for the EDR API, run from this directory against a running API with e.g.:
+#   locust --headless -u 200 -r 20 --run-time 120 --only-summary --csv api --host http://localhost:8008
+#
+# To compare the grpc.aio code path with the blocking one (threadpool), run the same command once
+# against the API started with DSASYNC=true (default) and once with DSASYNC=false:
+#   DSASYNC=false docker compose up -d api
+# and compare the response time percentiles in api_stats.csv. With many concurrent users the
+# blocking mode is limited by the size of the threadpool (40 threads per worker).
+# This comparison has not been measured yet (no numbers for either mode against a real datastore);
+# record the percentiles of both runs here once it has been.
+#
+# Likewise, compare the "many parameters" requests with DSFANOUT=false (default) and DSFANOUT=true, which
+# splits them into concurrent datastore requests per parameter (see also benchmark_fan_out.py).
 import random
 
 from locust import HttpUser
@@ -5,6 +18,7 @@ from locust import task
 
 
 parameters = ["ff", "dd", "rh", "pp", "tn"]
+many_parameters = ["ff", "dd", "rh", "pp", "tn", "tx", "td", "vv", "qg", "ww"]
 # fmt: off
 stations = [
     "06203", "06204", "06205", "06207", "06208", "06211", "06214", "06215", "06235", "06239",
@@ -27,6 +41,15 @@ class WebsiteUser(HttpUser):
             headers=headers,
         )
 
+    @task
+    def get_data_single_station_many_parameters(self):
+        station_id = random.choice(stations)
+        self.client.get(
+            f"/collections/observations/locations/{station_id}?parameter-name={','.join(many_parameters)}",
+            name="single station many parameters",
+            headers=headers,
+        )
+
     @task
     def get_data_bbox_three_parameters(self):
         self.client.get(
@@ -1,30 +1,24 @@
 # Run with:
-# For developing:    uvicorn main:app --reload
-import math
+# For developing:    PYTHONPATH=.. uvicorn main:app --reload
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from datetime import datetime
 from datetime import timedelta
-from datetime import timezone
-from itertools import groupby
+from typing import Callable
 from typing import Tuple
 
+import covjson
 import datastore_pb2 as dstore
-import datastore_pb2_grpc as dstore_grpc
-import grpc
+import dsclient
+import grpc_getter
 import metadata_endpoints
+import response_cache
+import station_index
+import timing
 from brotli_asgi import BrotliMiddleware
 from covjson_pydantic.coverage import Coverage
 from covjson_pydantic.coverage import CoverageCollection
-from covjson_pydantic.domain import Axes
-from covjson_pydantic.domain import Domain
-from covjson_pydantic.domain import DomainType
-from covjson_pydantic.domain import ValuesAxis
-from covjson_pydantic.ndarray import NdArray
-from covjson_pydantic.observed_property import ObservedProperty
-from covjson_pydantic.parameter import Parameter
-from covjson_pydantic.reference_system import ReferenceSystem
-from covjson_pydantic.reference_system import ReferenceSystemConnectionObject
-from covjson_pydantic.unit import Unit
 from edr_pydantic.capabilities import LandingPageModel
 from edr_pydantic.collections import Collection
 from edr_pydantic.collections import Collections
@@ -33,95 +27,107 @@ from fastapi import HTTPException
 from fastapi import Path
 from fastapi import Query
 from fastapi.requests import Request
+from fastapi.responses import ORJSONResponse
+from fastapi.responses import PlainTextResponse
+from fastapi.responses import StreamingResponse
 from geojson_pydantic import Feature
 from geojson_pydantic import FeatureCollection
 from geojson_pydantic import Point
 from google.protobuf.timestamp_pb2 import Timestamp
 from pydantic import AwareDatetime
+from pydantic import BaseModel
 from pydantic import TypeAdapter
 from shapely import buffer
 from shapely import geometry
 from shapely import wkt
-
-
-app = FastAPI()
+from starlette.concurrency import run_in_threadpool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    grpc_getter.init_channel_pool()
+    # Cached metadata responses are made from the snapshot, so drop them when it changes
+    refresh_tasks = [
+        asyncio.create_task(metadata_endpoints.refresh_periodically(response_cache.metadata_cache.clear)),
+        asyncio.create_task(station_index.refresh_periodically()),
+    ]
+    yield
+    for task in refresh_tasks:
+        task.cancel()
+    await grpc_getter.close_channel_pool()
+
+
+# Build coverages as pydantic models, which are then validated against the response model. This is
+# slow for large responses, so by default the CoverageJSON is serialized directly
+VALIDATE_COVJSON = os.getenv("COVJSONVALIDATE", "false").lower() == "true"
+# Stream a CoverageCollection one coverage at a time, instead of building the whole document first
+STREAM_COVJSON = os.getenv("COVJSONSTREAM", "true").lower() == "true"
+
+
+app = FastAPI(lifespan=lifespan)
+if timing.ENABLED:
+    # Inside BrotliMiddleware, so compressing the response is part of the "send" stage
+    app.add_middleware(timing.TimingMiddleware)
+    # Before the channel pool is opened, as only the channels opened after it are timed
+    dsclient.add_call_hook(timing.observe_datastore_call)
 app.add_middleware(BrotliMiddleware)
 
 
-def collect_data(ts_mdata, obs_mdata):
-    lat = obs_mdata[0].geo_point.lat  # HACK: For now assume they all have the same position
-    lon = obs_mdata[0].geo_point.lon
-    tuples = (
-        (o.obstime_instant.ToDatetime(tzinfo=timezone.utc), float(o.value)) for o in obs_mdata
-    )  # HACK: str -> float
-    (times, values) = zip(*tuples)
-    param_id = ts_mdata.instrument
-    unit = ts_mdata.unit
-
-    return (lat, lon, times), param_id, unit, values
-
-
-def get_data_for_time_series(get_obs_request):
-    with grpc.insecure_channel(f"{os.getenv('DSHOST', 'localhost')}:{os.getenv('DSPORT', '50050')}") as channel:
-        grpc_stub = dstore_grpc.DatastoreStub(channel)
-        response = grpc_stub.GetObservations(get_obs_request)
-
-        # Collect data
-        coverages = []
-        data = [collect_data(md.ts_mdata, md.obs_mdata) for md in response.observations]
-
-        # Need to sort before using groupBy. Also sort on param_id to get consistently sorted output
-        data.sort(key=lambda x: (x[0], x[1]))
-        # The multiple coverage logic is not needed for this endpoint,
-        # but we want to share this code between endpoints
-        for (lat, lon, times), group in groupby(data, lambda x: x[0]):
-            referencing = [
-                ReferenceSystemConnectionObject(
-                    coordinates=["y", "x"],
-                    system=ReferenceSystem(type="GeographicCRS", id="http://www.opengis.net/def/crs/EPSG/0/4326"),
-                ),
-                ReferenceSystemConnectionObject(
-                    coordinates=["z"],
-                    system=ReferenceSystem(type="TemporalRS", calendar="Gregorian"),
-                ),
-            ]
-            domain = Domain(
-                domainType=DomainType.point_series,
-                axes=Axes(
-                    x=ValuesAxis[float](values=[lon]),
-                    y=ValuesAxis[float](values=[lat]),
-                    t=ValuesAxis[AwareDatetime](values=times),
-                ),
-                referencing=referencing,
-            )
-
-            parameters = {}
-            ranges = {}
-            for (_, _, _), param_id, unit, values in group:
-                if all(math.isnan(v) for v in values):
-                    continue  # Drop ranges if completely nan.
-                    # TODO: Drop the whole coverage if it becomes empty?
-                values_no_nan = [v if not math.isnan(v) else None for v in values]
-                # TODO: Improve this based on "standard name", etc.
-                parameters[param_id] = Parameter(
-                    observedProperty=ObservedProperty(label={"en": param_id}), unit=Unit(label={"en": unit})
-                )  # TODO: Also fill symbol?
-                ranges[param_id] = NdArray(
-                    values=values_no_nan, axisNames=["t", "y", "x"], shape=[len(values_no_nan), 1, 1]
-                )
-
-            coverages.append(Coverage(domain=domain, parameters=parameters, ranges=ranges))
-
-        if len(coverages) == 0:
-            raise HTTPException(status_code=404, detail="No data found")
-        elif len(coverages) == 1:
-            return coverages[0]
-        else:
-            return CoverageCollection(
-                coverages=coverages, parameters=coverages[0].parameters
-            )  # HACK to take parameters from first one
-
+async def get_data_for_time_series(get_obs_request, request: Request):
+    cache = response_cache.cache
+    with timing.stage("cache"):
+        cache_key = response_cache.cache_key(get_obs_request) if cache.enabled and not VALIDATE_COVJSON else None
+        entry = cache.get(cache_key) if cache_key is not None else None
+    if entry is not None:
+        return response_cache.cached_response(entry, request.headers)
 
+    if grpc_getter.CHUNKED:
+        with timing.stage("datastore"):
+            series = await grpc_getter.get_series(get_obs_request)
+        with timing.stage("group"):
+            groups = covjson.group_series(series)
+    else:
+        with timing.stage("datastore"):
+            response = await grpc_getter.fan_out_observations(get_obs_request)
+        with timing.stage("group"):
+            groups = covjson.group_observations(response)
+    if VALIDATE_COVJSON:
+        # Validating the returned models against the response_model happens after this, in FastAPI
+        with timing.stage("covjson"):
+            return covjson.make_covjson(groups)
+    # Returning a Response skips validation against (but keeps the OpenAPI schema of) the response_model
+    if STREAM_COVJSON and len(groups) > 1:
+        # Streaming bounds the memory for serializing, but not for the result from the datastore: that is
+        # all fetched and grouped above (also with CHUNKED, as a coverage covers the whole time axis).
+        # The (sync) generator is iterated in the threadpool, so building coverages doesn't block the event loop
+        chunks = covjson.stream_covjson_collection(groups)
+        if cache_key is not None:
+            chunks = cache.tee(cache_key, chunks)
+        return StreamingResponse(chunks, media_type="application/json")
+    # Building, serializing and compressing the body are CPU bound, so they run in the threadpool
+    with timing.stage("covjson"):
+        http_response = await run_in_threadpool(lambda: ORJSONResponse(covjson.make_covjson_dict(groups)))
+    if cache_key is not None:
+        with timing.stage("compress"):
+            entry = await run_in_threadpool(cache.put, cache_key, http_response.body)
+        if entry is not None:
+            # Serve the compressed body that was just cached, instead of compressing it again in the middleware
+            return response_cache.cached_response(entry, request.headers)
+    return http_response
+
+
+def get_metadata(request: Request, make_model: Callable[[Request], BaseModel]):
+    # The links in the metadata are made from the request URL, so that is the cache key
+    cache = response_cache.metadata_cache
+    key = str(request.url).encode()
+    if (entry := cache.get(key)) is None:
+        with timing.stage("metadata"):
+            # Same as FastAPI would serialize the response_model
+            entry = cache.put(key, make_model(request).model_dump_json(by_alias=True, exclude_none=True).encode())
+    return response_cache.cached_response(entry, request.headers)
+
+
+@timing.timed("datetime")
 def get_datetime_range(datetime_string: str | None) -> Tuple[Timestamp, Timestamp] | None:
     if not datetime_string:
         return None
@@ -155,7 +161,7 @@ def get_datetime_range(datetime_string: str | None) -> Tuple[Timestamp, Timestam
     response_model_exclude_none=True,
 )
 async def landing_page(request: Request) -> LandingPageModel:
-    return metadata_endpoints.get_landing_page(request)
+    return get_metadata(request, metadata_endpoints.get_landing_page)
 
 
 @app.get(
@@ -165,7 +171,7 @@ async def landing_page(request: Request) -> LandingPageModel:
     response_model_exclude_none=True,
 )
 async def get_collections(request: Request) -> Collections:
-    return metadata_endpoints.get_collections(request)
+    return get_metadata(request, metadata_endpoints.get_collections)
 
 
 @app.get(
@@ -175,7 +181,7 @@ async def get_collections(request: Request) -> Collections:
     response_model_exclude_none=True,
 )
 async def get_collection_metadata(request: Request) -> Collection:
-    return metadata_endpoints.get_collection_metadata(request)
+    return get_metadata(request, metadata_endpoints.get_collection_metadata)
 
 
 @app.get(
@@ -184,32 +190,22 @@ async def get_collection_metadata(request: Request) -> Collection:
     response_model=FeatureCollection,
     response_model_exclude_none=True,
 )
-# We can currently only query data, even if we only need metadata like for this endpoint
-# Maybe it would be better to only query a limited set of data instead of everything (meaning 24 hours)
-def get_locations(bbox: str = Query(..., example="5.0,52.0,6.0,52.1")) -> FeatureCollection:  # Hack to use string
-    left, bottom, right, top = map(str.strip, bbox.split(","))
-    poly = geometry.Polygon([(left, bottom), (right, bottom), (right, top), (left, top)])
-    with grpc.insecure_channel(f"{os.getenv('DSHOST', 'localhost')}:{os.getenv('DSPORT', '50050')}") as channel:
-        grpc_stub = dstore_grpc.DatastoreStub(channel)
-        ts_request = dstore.GetObsRequest(
-            instruments=["tn"],  # Hack
-            inside=dstore.Polygon(points=[dstore.Point(lat=coord[1], lon=coord[0]) for coord in poly.exterior.coords]),
+async def get_locations(bbox: str = Query(..., example="5.0,52.0,6.0,52.1")) -> FeatureCollection:  # Hack to use string
+    left, bottom, right, top = map(float, bbox.split(","))
+    index = station_index.get_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Locations not available yet")
+
+    features = [
+        Feature(
+            type="Feature",
+            id=platform,
+            properties=None,
+            geometry=Point(type="Point", coordinates=index.positions[platform]),
         )
-        ts_response = grpc_stub.GetObservations(ts_request)
-
-        features = [
-            Feature(
-                type="Feature",
-                id=ts.ts_mdata.platform,
-                properties=None,
-                geometry=Point(
-                    type="Point",
-                    coordinates=(ts.obs_mdata[0].geo_point.lon, ts.obs_mdata[0].geo_point.lat),
-                ),
-            )  # HACK: Assume loc the same
-            for ts in sorted(ts_response.observations, key=lambda ts: ts.ts_mdata.platform)
-        ]
-        return FeatureCollection(features=features, type="FeatureCollection")
+        for platform in index.platforms_in(geometry.box(left, bottom, right, top))
+    ]
+    return FeatureCollection(features=features, type="FeatureCollection")
 
 
 @app.get(
@@ -218,7 +214,8 @@ def get_locations(bbox: str = Query(..., example="5.0,52.0,6.0,52.1")) -> Featur
     response_model=Coverage,
     response_model_exclude_none=True,
 )
-def get_data_location_id(
+async def get_data_location_id(
+    request: Request,
     location_id: str = Path(..., example="06260"),
     parameter_name: str = Query(..., alias="parameter-name", example="dd,ff,rh,pp,tn"),
     datetime: str | None = None,
@@ -231,7 +228,7 @@ def get_data_location_id(
         instruments=list(map(str.strip, parameter_name.split(","))),
         interval=dstore.TimeInterval(start=range[0], end=range[1]) if range else None,
     )
-    return get_data_for_time_series(get_obs_request)
+    return await get_data_for_time_series(get_obs_request, request)
 
 
 @app.get(
@@ -240,7 +237,8 @@ def get_data_location_id(
     response_model=Coverage | CoverageCollection,
     response_model_exclude_none=True,
 )
-def get_data_position(
+async def get_data_position(
+    request: Request,
     coords: str = Query(..., example="POINT(5.179705 52.0988218)"),
     parameter_name: str = Query(..., alias="parameter-name", example="dd,ff,rh,pp,tn"),
     datetime: str | None = None,
@@ -248,7 +246,19 @@ def get_data_position(
     point = wkt.loads(coords)
     assert point.geom_type == "Point"
     poly = buffer(point, 0.0001, quad_segs=1)  # Roughly 10 meters around the point
-    return get_data_area(poly.wkt, parameter_name, datetime)
+    index = station_index.get_index()
+    platforms = index.platforms_in(poly) if index is not None else []
+    if not platforms:
+        # Not a known station (or the index is not loaded yet), so let the datastore search the area
+        return await get_data_area(request, poly.wkt, parameter_name, datetime)
+
+    range = get_datetime_range(datetime)
+    get_obs_request = dstore.GetObsRequest(
+        platforms=platforms,
+        instruments=list(map(str.strip, parameter_name.split(","))),
+        interval=dstore.TimeInterval(start=range[0], end=range[1]) if range else None,
+    )
+    return await get_data_for_time_series(get_obs_request, request)
 
 
 @app.get(
@@ -257,7 +267,8 @@ def get_data_position(
     response_model=Coverage | CoverageCollection,
     response_model_exclude_none=True,
 )
-def get_data_area(
+async def get_data_area(
+    request: Request,
     coords: str = Query(..., example="POLYGON((5.0 52.0, 6.0 52.0,6.0 52.1,5.0 52.1, 5.0 52.0))"),
     parameter_name: str = Query(..., alias="parameter-name", example="dd,ff,rh,pp,tn"),
     datetime: str | None = None,
@@ -267,7 +278,18 @@ def get_data_area(
     range = get_datetime_range(datetime)
     get_obs_request = dstore.GetObsRequest(
         instruments=list(map(str.strip, parameter_name.split(","))),
-        inside=dstore.Polygon(points=[dstore.Point(lat=coord[1], lon=coord[0]) for coord in poly.exterior.coords]),
+        inside=dsclient.polygon((lat, lon) for lon, lat in poly.exterior.coords),
         interval=dstore.TimeInterval(start=range[0], end=range[1]) if range else None,
     )
-    return get_data_for_time_series(get_obs_request)
+    return await get_data_for_time_series(get_obs_request, request)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    stats = {
+        "datastore_pool": grpc_getter.get_pool_stats(),
+        "response_cache": response_cache.cache.stats(),
+        "metadata_cache": response_cache.metadata_cache.stats(),
+    }
+    # Note that these are per worker process
+    return PlainTextResponse(timing.expose_metrics(stats), media_type="text/plain; version=0.0.4")
@@ -1,3 +1,13 @@
+import asyncio
+import logging
+import os
+from collections import namedtuple
+from datetime import timezone
+from typing import Callable
+
+import datastore_pb2 as dstore
+import grpc
+import grpc_getter
 from edr_pydantic.capabilities import Contact
 from edr_pydantic.capabilities import LandingPageModel
 from edr_pydantic.capabilities import Provider
@@ -7,9 +17,88 @@ from edr_pydantic.data_queries import DataQueries
 from edr_pydantic.data_queries import EDRQuery
 from edr_pydantic.extent import Extent
 from edr_pydantic.extent import Spatial
+from edr_pydantic.extent import Temporal
 from edr_pydantic.link import EDRQueryLink
 from edr_pydantic.link import Link
+from edr_pydantic.observed_property import ObservedProperty
+from edr_pydantic.parameter import Parameter
+from edr_pydantic.unit import Unit
 from edr_pydantic.variables import Variables
+from fastapi import HTTPException
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between refreshes of the extents and parameters of the collection from the datastore
+REFRESH_INTERVAL = float(os.getenv("METADATAREFRESH", "60"))
+TRS = 'TIMECRS["DateTime",TDATUM["Gregorian Calendar"],CS[TemporalDateTime,1],AXIS["Time (T)",future]]'
+
+# The part of the collection metadata that comes from the datastore
+MetadataSnapshot = namedtuple("MetadataSnapshot", ["extent", "parameter_names"])
+
+_snapshot: MetadataSnapshot | None = None
+
+
+def make_extent(extents_response) -> Extent:
+    box = extents_response.spatial_extent
+    interval = extents_response.temporal_extent
+    start = interval.start.ToDatetime(tzinfo=timezone.utc)
+    end = interval.end.ToDatetime(tzinfo=timezone.utc)
+    return Extent(
+        spatial=Spatial(bbox=[[box.left, box.bottom, box.right, box.top]], crs="WGS84"),
+        temporal=Temporal(
+            interval=[[start, end]],
+            values=[f"{start:%Y-%m-%dT%H:%M:%SZ}/{end:%Y-%m-%dT%H:%M:%SZ}"],
+            trs=TRS,
+        ),
+    )
+
+
+def make_parameter_names(ts_attr_groups_response) -> dict[str, Parameter]:
+    parameter_names = {}
+    for group in sorted(ts_attr_groups_response.groups, key=lambda g: g.combo.instrument):
+        ts = group.combo
+        parameter_names[ts.instrument] = Parameter(
+            id=ts.instrument,
+            label=ts.title or None,
+            observedProperty=ObservedProperty(
+                id=f"https://vocab.nerc.ac.uk/standard_name/{ts.standard_name}" if ts.standard_name else None,
+                label=ts.standard_name or ts.instrument,
+            ),
+            unit=Unit(label=ts.unit) if ts.unit else None,
+        )
+    return parameter_names
+
+
+async def refresh_snapshot() -> bool:
+    """Get the current extents and parameters from the datastore. Returns whether they changed."""
+    global _snapshot
+    extents_response, ts_attr_groups_response = await asyncio.gather(
+        grpc_getter.call("GetExtents", dstore.GetExtentsRequest()),
+        grpc_getter.call(
+            "GetTSAttrGroups", dstore.GetTSAGRequest(attrs=["instrument", "title", "standard_name", "unit"])
+        ),
+    )
+    snapshot = MetadataSnapshot(make_extent(extents_response), make_parameter_names(ts_attr_groups_response))
+    changed = snapshot != _snapshot
+    _snapshot = snapshot
+    return changed
+
+
+async def refresh_periodically(on_change: Callable[[], None]):
+    """Keep the snapshot up to date, calling on_change whenever it changed. Runs until cancelled."""
+    while True:
+        try:
+            if await refresh_snapshot():
+                logger.info(f"Collection metadata changed: {len(_snapshot.parameter_names)} parameters")
+                on_change()
+        except grpc.RpcError as e:
+            # E.g. the datastore is not up yet, or still empty
+            logger.warning(f"Failed to refresh collection metadata: {e}")
+        except Exception:
+            # Keep the last snapshot, and try again next time
+            logger.exception("Failed to refresh collection metadata")
+        await asyncio.sleep(REFRESH_INTERVAL)
 
 
 def get_landing_page(request):
@@ -30,12 +119,14 @@ def get_landing_page(request):
 
 
 def get_collection_metadata(request) -> Collection:
+    if _snapshot is None:
+        raise HTTPException(status_code=503, detail="Collection metadata not available yet")
     collection = Collection(
         id="observations",
         links=[
             Link(href=f"{request.url}/observations", rel="self"),
         ],
-        extent=Extent(spatial=Spatial(bbox=[[3.0, 50.0, 8.0, 55.0]], crs="WGS84")),  # TODO: Get this from database
+        extent=_snapshot.extent,
         data_queries=DataQueries(
             position=EDRQuery(
                 link=EDRQueryLink(
@@ -61,7 +152,7 @@ def get_collection_metadata(request) -> Collection:
         ),
         crs=["WGS84"],
         output_formats=["CoverageJSON"],
-        parameter_names={},  # TODO: Get these from database
+        parameter_names=_snapshot.parameter_names,
     )
     return collection
 
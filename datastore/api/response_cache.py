@@ -0,0 +1,193 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+from collections import OrderedDict
+from typing import Iterator
+
+import brotli
+import datastore_pb2 as dstore
+from fastapi import Response
+from fastapi.datastructures import Headers
+from shapely import geometry
+
+
+MAX_BYTES = int(os.getenv("RESPONSECACHEMAXBYTES", str(256 * 1024 * 1024)))  # 0 disables the cache
+MAX_ENTRY_BYTES = int(os.getenv("RESPONSECACHEMAXENTRYBYTES", str(32 * 1024 * 1024)))
+TTL = float(os.getenv("RESPONSECACHETTL", "600"))  # seconds
+# Also keep Brotli and gzip compressed copies of each body, so a hit costs no compression at all
+COMPRESS = os.getenv("RESPONSECACHECOMPRESS", "true").lower() == "true"
+BROTLI_QUALITY = 4  # Same as the default of BrotliMiddleware
+GZIP_LEVEL = 6  # The zlib default, much faster than 9 for a slightly larger body
+METADATA_MAX_BYTES = 16 * 1024 * 1024
+
+CachedBody = namedtuple("CachedBody", ["expires", "etag", "body", "br_body", "gzip_body"])
+
+
+def cache_key(get_obs_request) -> bytes | None:
+    """Get the cache key of a GetObsRequest, or None if its response should not be cached.
+
+    The key is the serialized request with the parameter and platform lists sorted and the polygon
+    normalized, so equivalent queries share an entry. Requests without an interval, or whose interval
+    ends after now (e.g. open-ended ".." intervals), are not cached as their response can still change.
+    """
+    if not get_obs_request.HasField("interval") or get_obs_request.interval.end.seconds >= time.time():
+        return None
+
+    key = dstore.GetObsRequest()
+    key.CopyFrom(get_obs_request)
+    for field in (key.platforms, key.instruments, key.standard_names, key.processing_levels):
+        values = sorted(set(field))
+        del field[:]
+        field.extend(values)
+    if key.HasField("inside"):
+        poly = geometry.Polygon([(p.lon, p.lat) for p in key.inside.points]).normalize()
+        key.inside.CopyFrom(dstore.Polygon(points=[dstore.Point(lat=y, lon=x) for x, y in poly.exterior.coords]))
+    return key.SerializeToString(deterministic=True)
+
+
+class ResponseCache:
+    """In-process LRU cache of encoded response bodies, with a TTL and a bound on the total size."""
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int, ttl: float, compress: bool):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.ttl = ttl
+        self.compress = compress
+        self._entries: OrderedDict[bytes, CachedBody] = OrderedDict()
+        self._size = 0
+        # Entries are also added from streaming responses, which are iterated in the threadpool
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def _entry_size(entry: CachedBody) -> int:
+        return sum(len(body) for body in (entry.body, entry.br_body, entry.gzip_body) if body is not None)
+
+    def _remove(self, key: bytes):
+        self._size -= self._entry_size(self._entries.pop(key))
+
+    def get(self, key: bytes) -> CachedBody | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: bytes, body: bytes) -> CachedBody | None:
+        if len(body) > self.max_entry_bytes:
+            return None
+        entry = CachedBody(
+            expires=time.monotonic() + self.ttl,
+            # Weak, as the same ETag is used for all content encodings of the body
+            etag=f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+            body=body,
+            br_body=brotli.compress(body, quality=BROTLI_QUALITY) if self.compress else None,
+            gzip_body=gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0) if self.compress else None,
+        )
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._size += self._entry_size(entry)
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def tee(self, key: bytes, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """Pass on a streamed body, and cache it once it has been streamed completely."""
+        parts = []
+        size = 0
+        for chunk in chunks:
+            if parts is not None:
+                size += len(chunk)
+                if size <= self.max_entry_bytes:
+                    parts.append(chunk)
+                else:
+                    parts = None  # Too big to cache
+            yield chunk
+        if parts is not None:
+            self.put(key, b"".join(parts))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    """Weak comparison of an ETag with an If-None-Match header."""
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def accepted_encodings(accept_encoding: str) -> dict[str, float]:
+    """The q value of each coding in an Accept-Encoding header, e.g. {"gzip": 1.0, "br": 0.0} for "gzip, br;q=0"."""
+    encodings = {}
+    for token in accept_encoding.split(","):
+        coding, *params = (part.strip() for part in token.split(";"))
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        encodings[coding.lower()] = q
+    return encodings
+
+
+def cached_response(entry: CachedBody, request_headers: Headers, media_type: str = "application/json") -> Response:
+    """Serve a cached body, as 304 Not Modified if the client has it already, else in the best encoding it accepts.
+
+    A response with a Content-Encoding is passed on as is by BrotliMiddleware.
+    """
+    headers = {"ETag": entry.etag, "Vary": "Accept-Encoding"}
+    if etag_matches(entry.etag, request_headers.get("if-none-match", "")):
+        return Response(status_code=304, headers=headers)
+
+    accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+    # The coding with the highest q value, Brotli if equal, and none if neither is acceptable (q=0)
+    best_q, best = 0.0, None
+    for encoding, body in [("br", entry.br_body), ("gzip", entry.gzip_body)]:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if body is not None and q > best_q:
+            best_q, best = q, (encoding, body)
+    if best is not None:
+        encoding, body = best
+        return Response(body, media_type=media_type, headers=headers | {"Content-Encoding": encoding})
+    return Response(entry.body, media_type=media_type, headers=headers)
+
+
+cache = ResponseCache(MAX_BYTES, MAX_ENTRY_BYTES, TTL, COMPRESS)
+# The metadata endpoints are small and the same for every request (with the same base URL)
+metadata_cache = ResponseCache(METADATA_MAX_BYTES, METADATA_MAX_BYTES, TTL, COMPRESS)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+from datetime import timedelta
+from datetime import timezone
+
+import datastore_pb2 as dstore
+import grpc
+import grpc_getter
+from shapely import geometry
+from shapely import STRtree
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between refreshes of the station positions from the datastore, the same setting as for
+# the collection metadata, so both include new data at the same time
+REFRESH_INTERVAL = float(os.getenv("METADATAREFRESH", "60"))
+# The position of a new platform is looked up in its most recent observations, starting with this
+# window before the end of the temporal extent and widening it until all positions are found
+POSITION_WINDOW = timedelta(hours=1)
+
+
+class StationIndex:
+    """Position of every platform in the datastore, with a spatial index for bbox lookups.
+
+    Platforms are assumed to be stationary.
+    """
+
+    def __init__(self, positions: dict[str, tuple[float, float]]):
+        self.positions = positions  # platform -> (lon, lat)
+        self._platforms = sorted(positions)
+        self._tree = STRtree([geometry.Point(positions[platform]) for platform in self._platforms])
+
+    def platforms_in(self, area) -> list[str]:
+        """Platforms inside or on the boundary of a shapely geometry, sorted."""
+        return [self._platforms[i] for i in sorted(self._tree.query(area, predicate="intersects"))]
+
+
+_index: StationIndex | None = None
+
+
+def get_index() -> StationIndex | None:
+    return _index
+
+
+async def find_positions(platforms: set[str]) -> dict[str, tuple[float, float]]:
+    extents = await grpc_getter.call("GetExtents", dstore.GetExtentsRequest())
+    first = extents.temporal_extent.start.ToDatetime(tzinfo=timezone.utc)
+    last = extents.temporal_extent.end.ToDatetime(tzinfo=timezone.utc)
+
+    positions = {}
+    window = POSITION_WINDOW
+    while len(positions) < len(platforms):
+        interval = dstore.TimeInterval()
+        interval.start.FromDatetime(max(last - window, first))
+        interval.end.FromDatetime(last + timedelta(seconds=1))  # The interval is [start, end)
+        missing = sorted(platforms - positions.keys())
+        response = await grpc_getter.get_observations(dstore.GetObsRequest(platforms=missing, interval=interval))
+        for md in response.observations:
+            if md.obs_mdata:
+                positions[md.ts_mdata.platform] = (md.obs_mdata[0].geo_point.lon, md.obs_mdata[0].geo_point.lat)
+        if last - window <= first:
+            break
+        window *= 4
+    return positions
+
+
+async def refresh_index():
+    """Update the index with the platforms currently in the datastore, only looking up the positions of new ones."""
+    global _index
+    response = await grpc_getter.call("GetTSAttrGroups", dstore.GetTSAGRequest(attrs=["platform"]))
+    platforms = {group.combo.platform for group in response.groups}
+
+    old_positions = _index.positions if _index is not None else {}
+    positions = {platform: position for platform, position in old_positions.items() if platform in platforms}
+    if new_platforms := platforms - positions.keys():
+        positions |= await find_positions(new_platforms)
+    if _index is None or positions != old_positions:
+        logger.info(f"Station index updated: {len(positions)} platforms")
+        _index = StationIndex(positions)
+
+
+async def refresh_periodically():
+    """Keep the index up to date. Runs until cancelled."""
+    while True:
+        try:
+            await refresh_index()
+        except grpc.RpcError as e:
+            # E.g. the datastore is not up yet, or still empty
+            logger.warning(f"Failed to refresh station index: {e}")
+        except Exception:
+            # Keep the last index, and try again next time
+            logger.exception("Failed to refresh station index")
+        await asyncio.sleep(REFRESH_INTERVAL)
@@ -0,0 +1,105 @@
+import json
+from datetime import datetime
+from pathlib import Path
+
+import covjson
+import datastore_pb2 as dstore
+import orjson
+import pytest
+from fastapi import HTTPException
+
+
+RESPONSE_PATH = Path(Path(__file__).parents[2], "integration-test", "response", "collection")
+
+
+def load_golden_file(path):
+    with open(Path(RESPONSE_PATH, path)) as file:
+        return json.load(file)
+
+
+def golden_file_to_get_obs_response(expected):
+    """Recreate the datastore response that the API turns into the expected CoverageJSON."""
+    response = dstore.GetObsResponse()
+    coverages = expected["coverages"] if expected["type"] == "CoverageCollection" else [expected]
+    for coverage in coverages:
+        axes = coverage["domain"]["axes"]
+        for param_id, ndarray in coverage["ranges"].items():
+            md = response.observations.add()
+            md.ts_mdata.instrument = param_id
+            md.ts_mdata.unit = coverage["parameters"][param_id]["unit"]["label"]["en"]
+            for time, value in zip(axes["t"]["values"], ndarray["values"]):
+                obs = md.obs_mdata.add()
+                obs.geo_point.lat = axes["y"]["values"][0]
+                obs.geo_point.lon = axes["x"]["values"][0]
+                obs.obstime_instant.FromDatetime(datetime.fromisoformat(time))
+                obs.value = "nan" if value is None else str(value)
+    # The datastore does not return the time series in any particular order
+    response.observations.reverse()
+    return response
+
+
+def serialize(response):
+    groups = covjson.group_observations(response)
+    return json.loads(orjson.dumps(covjson.make_covjson_dict(groups), option=orjson.OPT_SERIALIZE_NUMPY))
+
+
+def validate(response):
+    return json.loads(covjson.make_covjson(covjson.group_observations(response)).model_dump_json(exclude_none=True))
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "locations/200/single_location_with_multiple_parameters.json",
+        "position/200/single_coordinate_with_one_parameter.json",
+        "area/200/data_within_an_area_with_two_parameters.json",
+    ],
+)
+def test_fast_serialization_matches_golden_file(path):
+    expected = load_golden_file(path)
+    response = golden_file_to_get_obs_response(expected)
+
+    assert serialize(response) == expected
+    assert validate(response) == expected
+
+
+def test_fast_serialization_matches_pydantic_models_with_nan():
+    response = dstore.GetObsResponse()
+    for platform, lat, lon in [("06260", 52.098821802977, 5.1797058644882), ("06275", 52.0548617826, 5.8723225499118)]:
+        for param_id, values in [("ff", ["1.5", "nan", "2.5"]), ("rh", ["nan", "nan", "nan"]), ("dd", ["1", "2", "3"])]:
+            md = response.observations.add()
+            md.ts_mdata.platform = platform
+            md.ts_mdata.instrument = param_id
+            md.ts_mdata.unit = "unit"
+            for i, value in enumerate(values):
+                obs = md.obs_mdata.add()
+                obs.geo_point.lat, obs.geo_point.lon = lat, lon
+                obs.obstime_instant.seconds = 1672444800 + i * 600
+                obs.obstime_instant.nanos = 500000000 if platform == "06275" else 0
+                obs.value = value
+
+    actual = serialize(response)
+
+    assert actual == validate(response)
+    # Coverages are sorted on latitude first
+    assert actual["coverages"][0]["domain"]["axes"]["t"]["values"][0] == "2022-12-31T00:00:00.500000Z"
+    assert actual["coverages"][1]["domain"]["axes"]["t"]["values"][0] == "2022-12-31T00:00:00Z"
+    assert actual["coverages"][1]["ranges"]["ff"]["values"] == [1.5, None, 2.5]
+    assert "rh" not in actual["coverages"][1]["ranges"]
+
+
+def test_streamed_collection_matches_golden_file():
+    expected = load_golden_file("area/200/data_within_an_area_with_two_parameters.json")
+    groups = covjson.group_observations(golden_file_to_get_obs_response(expected))
+
+    streamed = b"".join(covjson.stream_covjson_collection(groups))
+
+    assert streamed == orjson.dumps(covjson.make_covjson_dict(groups), option=orjson.OPT_SERIALIZE_NUMPY)
+    assert json.loads(streamed) == expected
+
+
+@pytest.mark.parametrize("make", [covjson.make_covjson, covjson.make_covjson_dict, covjson.stream_covjson_collection])
+def test_no_data_found(make):
+    with pytest.raises(HTTPException) as exc_info:
+        make(covjson.group_observations(dstore.GetObsResponse()))
+    assert exc_info.value.status_code == 404
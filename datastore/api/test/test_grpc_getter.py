@@ -0,0 +1,106 @@
+import asyncio
+from datetime import datetime
+from datetime import timedelta
+
+import datastore_pb2 as dstore
+import grpc_getter
+import numpy as np
+import pytest
+
+
+def create_request(instruments, hours):
+    interval = dstore.TimeInterval()
+    interval.start.FromDatetime(datetime(2022, 12, 31))
+    interval.end.FromDatetime(datetime(2022, 12, 31) + timedelta(hours=hours))
+    return dstore.GetObsRequest(platforms=["06260"], instruments=instruments, interval=interval)
+
+
+def create_response(instrument, seconds):
+    response = dstore.GetObsResponse()
+    md = response.observations.add()
+    md.ts_mdata.platform = "06260"
+    md.ts_mdata.instrument = instrument
+    for s in seconds:
+        md.obs_mdata.add().obstime_instant.seconds = s
+    return response
+
+
+def test_split_request_by_instrument(monkeypatch):
+    monkeypatch.setattr(grpc_getter, "FAN_OUT_WINDOW", timedelta(0))
+
+    requests = grpc_getter.split_request(create_request(["dd", "ff", "dd"], 24))
+
+    assert [list(r.instruments) for r in requests] == [["dd"], ["ff"]]
+    assert all(list(r.platforms) == ["06260"] for r in requests)
+    assert all(r.interval == create_request([], 24).interval for r in requests)
+
+
+def test_split_request_by_time_window(monkeypatch):
+    monkeypatch.setattr(grpc_getter, "FAN_OUT_WINDOW", timedelta(hours=10))
+
+    requests = grpc_getter.split_request(create_request(["dd", "ff"], 24))
+
+    assert [(list(r.instruments), r.interval.start.ToDatetime().hour) for r in requests] == [
+        (["dd"], 0),
+        (["dd"], 10),
+        (["dd"], 20),
+        (["ff"], 0),
+        (["ff"], 10),
+        (["ff"], 20),
+    ]
+    assert requests[2].interval.end == create_request([], 24).interval.end
+    # Too many windows, e.g. for an open-ended interval
+    assert len(grpc_getter.split_request(create_request(["dd"], 24 * 365))) == 1
+
+
+def test_split_request_open_ended_interval(monkeypatch):
+    monkeypatch.setattr(grpc_getter, "FAN_OUT_WINDOW", timedelta(hours=10))
+    start_only = create_request(["dd"], 24)
+    start_only.interval.ClearField("end")
+    end_only = create_request(["dd"], 24)
+    end_only.interval.ClearField("start")
+
+    assert grpc_getter.split_request(start_only) == [start_only]
+    assert grpc_getter.split_request(end_only) == [end_only]
+
+
+def test_merge_responses_joins_time_series():
+    merged = grpc_getter.merge_responses(
+        [create_response("dd", [0, 600]), create_response("dd", [1200]), create_response("ff", [0])]
+    )
+
+    assert [md.ts_mdata.instrument for md in merged.observations] == ["dd", "ff"]
+    assert [obs.obstime_instant.seconds for obs in merged.observations[0].obs_mdata] == [0, 600, 1200]
+
+
+@pytest.mark.parametrize("start,end", [(None, None), (datetime.min, datetime.max)])
+def test_get_series_in_chunks(monkeypatch, start, end):
+    requests = []
+
+    async def call(method_name, request):
+        assert method_name == "GetExtents"
+        return dstore.GetExtentsResponse(temporal_extent=create_request([], 24).interval)
+
+    async def get_observations(request):
+        requests.append(request)
+        start = request.interval.start.seconds if request.interval.HasField("start") else 0
+        end = request.interval.end.seconds if request.interval.HasField("end") else 2**40
+        first = create_request([], 0).interval.start.seconds
+        seconds = range(max(start, first), min(end, first + 24 * 3600), 600)
+        return grpc_getter.merge_responses([create_response("dd", seconds), create_response("ff", seconds)])
+
+    monkeypatch.setattr(grpc_getter, "call", call)
+    monkeypatch.setattr(grpc_getter, "get_observations", get_observations)
+
+    request = dstore.GetObsRequest(platforms=["06260"])
+    if start is not None:
+        # As main.get_datetime_range gives "../.."
+        request.interval.start.FromDatetime(start)
+        request.interval.end.FromDatetime(end)
+    series = asyncio.run(grpc_getter.get_series(request))
+
+    # Chunked over the day of the extent, with the first chunk an hour
+    assert 1 < len(requests) <= 5
+    assert [s.ts_mdata.instrument for s in series] == ["dd", "ff"]
+    expected = (create_request([], 0).interval.start.seconds + np.arange(0, 24 * 3600, 600)) * 1_000_000_000
+    assert all((s.times.view(np.int64) == expected).all() for s in series)
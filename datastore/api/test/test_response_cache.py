@@ -0,0 +1,149 @@
+import gzip
+import time
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+import brotli
+import datastore_pb2 as dstore
+import pytest
+from fastapi.datastructures import Headers
+from response_cache import accepted_encodings
+from response_cache import cache_key
+from response_cache import cached_response
+from response_cache import ResponseCache
+
+
+def create_request(instruments, points, end):
+    interval = dstore.TimeInterval()
+    interval.start.FromDatetime(datetime(2022, 12, 31, tzinfo=timezone.utc))
+    interval.end.FromDatetime(end)
+    return dstore.GetObsRequest(
+        instruments=instruments,
+        inside=dstore.Polygon(points=[dstore.Point(lat=lat, lon=lon) for lat, lon in points]),
+        interval=interval,
+    )
+
+
+square = [(52.0, 5.0), (52.0, 6.0), (52.1, 6.0), (52.1, 5.0), (52.0, 5.0)]
+past = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+def test_cache_key_is_normalized():
+    key = cache_key(create_request(["rh", "ff"], square, past))
+
+    assert key is not None
+    assert key == cache_key(create_request(["ff", "rh", "ff"], square, past))
+    # Same polygon, starting at another point and with the opposite orientation
+    assert key == cache_key(create_request(["ff", "rh"], list(reversed(square[1:] + square[1:2])), past))
+    assert key != cache_key(create_request(["ff"], square, past))
+
+
+@pytest.mark.parametrize(
+    "end",
+    [datetime.max, datetime.now(timezone.utc) + timedelta(minutes=1)],
+)
+def test_cache_key_bypasses_intervals_including_now(end):
+    assert cache_key(create_request(["rh"], square, end)) is None
+
+
+def test_cache_key_bypasses_requests_without_interval():
+    assert cache_key(dstore.GetObsRequest(platforms=["06260"], instruments=["rh"])) is None
+
+
+def test_lru_eviction_on_size():
+    cache = ResponseCache(max_bytes=25, max_entry_bytes=25, ttl=60, compress=False)
+    cache.put(b"a", b"x" * 10)
+    cache.put(b"b", b"x" * 10)
+    assert cache.get(b"a") is not None  # Now b is the least recently used
+    cache.put(b"c", b"x" * 10)
+
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") is not None
+    assert cache.get(b"c") is not None
+    assert cache.stats() == {"entries": 2, "bytes": 20, "hits": 3, "misses": 1, "evictions": 1}
+
+
+def test_entries_too_big_are_not_cached():
+    cache = ResponseCache(max_bytes=100, max_entry_bytes=10, ttl=60, compress=False)
+    cache.put(b"a", b"x" * 11)
+    assert cache.get(b"a") is None
+
+    assert list(cache.tee(b"b", iter([b"x" * 6, b"x" * 6]))) == [b"x" * 6, b"x" * 6]
+    assert cache.get(b"b") is None
+
+
+def test_entries_expire():
+    cache = ResponseCache(max_bytes=100, max_entry_bytes=100, ttl=0.01, compress=False)
+    cache.put(b"a", b"body")
+    time.sleep(0.02)
+
+    assert cache.get(b"a") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_streamed_body_is_cached_when_complete():
+    cache = ResponseCache(max_bytes=100, max_entry_bytes=100, ttl=60, compress=True)
+    chunks = cache.tee(b"a", iter([b'{"a":', b"1}"]))
+    next(chunks)
+    assert cache.get(b"a") is None
+
+    assert list(chunks) == [b"1}"]
+    entry = cache.get(b"a")
+    assert entry.body == b'{"a":1}'
+    assert brotli.decompress(entry.br_body) == b'{"a":1}'
+
+
+def test_cached_response_content_encoding():
+    cache = ResponseCache(max_bytes=1000, max_entry_bytes=1000, ttl=60, compress=True)
+    entry = cache.put(b"a", b'{"a":1}')
+
+    response = cached_response(entry, Headers({"accept-encoding": "gzip, deflate, br"}))
+    assert response.headers["content-encoding"] == "br"
+    assert brotli.decompress(response.body) == b'{"a":1}'
+    response = cached_response(entry, Headers({"accept-encoding": "gzip, deflate"}))
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(response.body) == b'{"a":1}'
+    response = cached_response(entry, Headers())
+    assert "content-encoding" not in response.headers
+    assert response.body == b'{"a":1}'
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("gzip;q=1.0, br;q=0", "gzip"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("GZIP, BR", "br"),
+        ("brotli, xgzip", None),
+        ("br;q=0, gzip;q=0", None),
+        ("*", "br"),
+        ("*;q=0.5, br;q=0", "gzip"),
+        ("gzip;q=oops", None),
+    ],
+)
+def test_cached_response_accept_encoding_q_values(accept_encoding, expected):
+    cache = ResponseCache(max_bytes=1000, max_entry_bytes=1000, ttl=60, compress=True)
+    entry = cache.put(b"a", b'{"a":1}')
+
+    response = cached_response(entry, Headers({"accept-encoding": accept_encoding}))
+    assert response.headers.get("content-encoding") == expected
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("") == {}
+    assert accepted_encodings("gzip, deflate;q=0.5 , br ; q=0") == {"gzip": 1.0, "deflate": 0.5, "br": 0.0}
+
+
+def test_cached_response_not_modified():
+    cache = ResponseCache(max_bytes=1000, max_entry_bytes=1000, ttl=60, compress=True)
+    entry = cache.put(b"a", b'{"a":1}')
+    etag = cached_response(entry, Headers()).headers["etag"]
+
+    assert etag == cache.put(b"b", b'{"a":1}').etag
+    assert etag != cache.put(b"c", b'{"a":2}').etag
+    assert cached_response(entry, Headers({"if-none-match": etag})).status_code == 304
+    assert cached_response(entry, Headers({"if-none-match": f'"other", {etag.removeprefix("W/")}'})).status_code == 304
+    response = cached_response(entry, Headers({"if-none-match": '"other"'}))
+    assert response.status_code == 200
+    assert response.headers["etag"] == etag
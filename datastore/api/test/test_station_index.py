@@ -0,0 +1,89 @@
+import asyncio
+
+import datastore_pb2 as dstore
+import station_index
+from shapely import geometry
+from station_index import StationIndex
+
+
+positions = {
+    "06260": (5.1797058644882, 52.098821802977),
+    "06275": (5.8723225499118, 52.0548617826),
+    "06280": (6.5848470019087, 53.124542),
+}
+
+
+def test_platforms_in_bbox():
+    index = StationIndex(positions)
+
+    assert index.platforms_in(geometry.box(5.0, 52.0, 6.0, 52.1)) == ["06260", "06275"]
+    assert index.platforms_in(geometry.box(6.0, 53.0, 7.0, 54.0)) == ["06280"]
+    assert index.platforms_in(geometry.box(0.0, 0.0, 1.0, 1.0)) == []
+    assert StationIndex({}).platforms_in(geometry.box(5.0, 52.0, 6.0, 52.1)) == []
+
+
+class FakeDatastore:
+    def __init__(self, platforms):
+        self.platforms = platforms
+        self.requested_positions = []
+
+    async def call(self, method_name, request):
+        if method_name == "GetTSAttrGroups":
+            return dstore.GetTSAGResponse(
+                groups=[dstore.TSMdataGroup(combo=dstore.TSMetadata(platform=platform)) for platform in self.platforms]
+            )
+        assert method_name == "GetExtents"
+        response = dstore.GetExtentsResponse()
+        response.temporal_extent.start.seconds = 1672444800
+        response.temporal_extent.end.seconds = 1672444800 + 24 * 3600
+        return response
+
+    async def get_observations(self, request):
+        self.requested_positions.extend(request.platforms)
+        response = dstore.GetObsResponse()
+        for platform in request.platforms:
+            md = response.observations.add()
+            md.ts_mdata.platform = platform
+            obs = md.obs_mdata.add()
+            obs.geo_point.lon, obs.geo_point.lat = positions[platform]
+        return response
+
+
+def test_refresh_only_looks_up_new_platforms(monkeypatch):
+    datastore = FakeDatastore(["06260", "06275"])
+    monkeypatch.setattr(station_index.grpc_getter, "call", datastore.call)
+    monkeypatch.setattr(station_index.grpc_getter, "get_observations", datastore.get_observations)
+    monkeypatch.setattr(station_index, "_index", None)
+
+    asyncio.run(station_index.refresh_index())
+    assert station_index.get_index().positions == {p: positions[p] for p in ["06260", "06275"]}
+
+    datastore.platforms = ["06275", "06280"]
+    asyncio.run(station_index.refresh_index())
+    assert station_index.get_index().positions == {p: positions[p] for p in ["06275", "06280"]}
+    assert datastore.requested_positions == ["06260", "06275", "06280"]
+
+
+def test_refresh_periodically_keeps_going_after_an_error(monkeypatch):
+    datastore = FakeDatastore(["06260"])
+    calls = []
+
+    async def call(method_name, request):
+        calls.append(method_name)
+        if len(calls) == 1:
+            raise ValueError("Not an RpcError")
+        return await datastore.call(method_name, request)
+
+    monkeypatch.setattr(station_index.grpc_getter, "call", call)
+    monkeypatch.setattr(station_index.grpc_getter, "get_observations", datastore.get_observations)
+    monkeypatch.setattr(station_index, "_index", None)
+    monkeypatch.setattr(station_index, "REFRESH_INTERVAL", 0)
+
+    async def refresh_until_indexed():
+        task = asyncio.create_task(station_index.refresh_periodically())
+        while station_index._index is None:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(asyncio.wait_for(refresh_until_indexed(), 5))
+    assert station_index.get_index().positions == {"06260": positions["06260"]}
@@ -0,0 +1,42 @@
+import timing
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from timing import Histogram
+
+
+def test_histogram_is_cumulative():
+    histogram = Histogram("test_seconds", "Test.", ("stage",), buckets=(0.1, 1.0))
+    for seconds in [0.05, 0.1, 0.5, 2.0]:
+        histogram.observe(("a",), seconds)
+
+    assert histogram.expose() == [
+        "# HELP test_seconds Test.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{stage="a",le="0.1"} 2',
+        'test_seconds_bucket{stage="a",le="1.0"} 3',
+        'test_seconds_bucket{stage="a",le="+Inf"} 4',
+        'test_seconds_sum{stage="a"} 2.65',
+        'test_seconds_count{stage="a"} 4',
+    ]
+
+
+def test_server_timing_header_and_histograms():
+    app = FastAPI()
+    app.add_middleware(timing.TimingMiddleware)
+
+    @app.get("/")
+    async def get_root():
+        with timing.stage("first"):
+            pass
+        with timing.stage("second"):
+            pass
+        return {}
+
+    response = TestClient(app).get("/")
+
+    stages = [part.split(";")[0] for part in response.headers["server-timing"].split(", ")]
+    assert stages == ["first", "second", "total"]
+    metrics = timing.expose_metrics({"cache": {"hits": 3}})
+    assert 'edr_api_stage_seconds_count{endpoint="get_root",stage="second"} 1' in metrics
+    assert 'edr_api_stage_seconds_count{endpoint="get_root",stage="send"} 1' in metrics
+    assert "edr_api_cache_hits 3" in metrics
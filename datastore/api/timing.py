@@ -0,0 +1,158 @@
+import bisect
+import functools
+import os
+import threading
+from contextlib import contextmanager
+from contextlib import nullcontext
+from contextvars import ContextVar
+from time import perf_counter
+
+from starlette.datastructures import MutableHeaders
+
+
+# Time the stages of each request, report them in a Server-Timing header and collect them for /metrics
+ENABLED = os.getenv("APITIMING", "true").lower() == "true"
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stage durations of the current request, as a list of (stage, seconds)
+_timings: ContextVar[list | None] = ContextVar("timings", default=None)
+
+
+class Histogram:
+    """Prometheus style histogram of durations, per label values."""
+
+    def __init__(self, name: str, help: str, label_names: tuple[str, ...], buckets: tuple[float, ...] = BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: tuple[str, ...], seconds: float):
+        with self._lock:
+            series = self._series.setdefault(label_values, [0] * (len(self.buckets) + 1) + [0.0])
+            series[bisect.bisect_left(self.buckets, seconds)] += 1
+            series[-1] += seconds
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {label_values: list(counts) for label_values, counts in sorted(self._series.items())}
+        for label_values, counts in series.items():
+            labels = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, label_values))
+            cumulative = 0
+            for le, count in zip([*map(str, self.buckets), "+Inf"], counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {counts[-1]}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+stage_seconds = Histogram("edr_api_stage_seconds", "Time spent per request in each stage.", ("endpoint", "stage"))
+datastore_call_seconds = Histogram(
+    "edr_api_datastore_call_seconds", "Duration of the calls to the datastore.", ("method", "code")
+)
+
+
+def observe_datastore_call(method: str, seconds: float, code):
+    """Hook for dsclient.add_call_hook."""
+    datastore_call_seconds.observe((method, code.name), seconds)
+
+
+@contextmanager
+def _stage(name: str):
+    timings = _timings.get()
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.append((name, perf_counter() - start))
+
+
+_no_stage = nullcontext()
+
+
+def stage(name: str):
+    """Context manager timing a stage of the current request."""
+    return _stage(name) if ENABLED else _no_stage
+
+
+def timed(name: str):
+    """Decorator timing every call of a (sync) function as a stage. Returns the function as is if disabled."""
+
+    def decorator(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _stage(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def server_timing(timings: list) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings)
+
+
+class TimingMiddleware:
+    """Collect the stage timings of each request, and add them as a Server-Timing header.
+
+    Time spent after the response headers are sent, like compressing and streaming the body, is
+    only collected in the histograms as the "send" stage.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = []
+        token = _timings.set(timings)
+        start = perf_counter()
+        send_seconds = 0.0
+
+        async def send_with_timing(message):
+            nonlocal send_seconds
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(
+                    "Server-Timing", server_timing(timings + [("total", perf_counter() - start)])
+                )
+            send_start = perf_counter()
+            await send(message)
+            send_seconds += perf_counter() - send_start
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            # The router adds the endpoint to the scope
+            endpoint = getattr(scope.get("endpoint"), "__name__", "none")
+            totals = {}
+            for name, seconds in timings + [("send", send_seconds), ("total", perf_counter() - start)]:
+                totals[name] = totals.get(name, 0.0) + seconds
+            for name, seconds in totals.items():
+                stage_seconds.observe((endpoint, name), seconds)
+
+
+def expose_metrics(stats: dict[str, dict]) -> str:
+    """The timing histograms and the given stats, e.g. {"response_cache": {"hits": 1}}, in Prometheus text format."""
+    lines = stage_seconds.expose() + datastore_call_seconds.expose()
+    for group, values in stats.items():
+        for key, value in values.items():
+            name = f"edr_api_{group}_{key}"
+            lines.append(f"# TYPE {name} untyped")
+            if isinstance(value, list):
+                lines.extend(f'{name}{{index="{i}"}} {v}' for i, v in enumerate(value))
+            else:
+                lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
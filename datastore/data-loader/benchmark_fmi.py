@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Benchmark of building the PutObsRequests of an FMI CSV file, without sending them. Without a file, a
+# synthetic file with the given number of rows is written first. Run from this directory (after
+# generating the protobuf code) with e.g.:
+#   PYTHONPATH=.. python benchmark_fmi.py --rows 2000000
+import argparse
+import tempfile
+import uuid
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+
+import datastore_pb2 as dstore
+import numpy as np
+import pandas as pd
+from client_fmi_station import csv_file_to_requests
+from google.protobuf.timestamp_pb2 import Timestamp
+
+
+def per_row_requests(file_path):
+    """The request building as done before vectorizing: a TSMetadata and strptime per row."""
+    time_format = "%Y%m%d %H:%M:%S"
+    df = pd.read_csv(file_path, encoding="iso-8859-15", encoding_errors="replace")
+    df.dropna(subset=["DATA_VALUE"], inplace=True)
+    df = df.drop_duplicates(subset=["STATION_ID", "MEASURAND_CODE", "DATA_TIME"])
+    df.fillna("None", inplace=True)
+    for _, station_rows in df.groupby("STATION_ID"):
+        observations = []
+        for _, r in station_rows.iterrows():
+            ts_mdata = dstore.TSMetadata(
+                platform=str(r["STATION_ID"]),
+                instrument=str(r["MEASURAND_CODE"]),
+                title="FMI test data",
+                standard_name=str(r["MEASURAND_CODE"]),
+                unit=r["MEASURAND_UNIT"],
+            )
+            ts = Timestamp()
+            ts.FromDatetime(datetime.strptime(r["DATA_TIME"], time_format))
+            obs_mdata = dstore.ObsMetadata(
+                id=str(uuid.uuid4()),
+                geo_point=dstore.Point(lat=r["LATITUDE"], lon=r["LONGITUDE"]),
+                obstime_instant=ts,
+                value=str(r["DATA_VALUE"]),
+            )
+            observations.append(dstore.Metadata1(ts_mdata=ts_mdata, obs_mdata=obs_mdata))
+        yield dstore.PutObsRequest(observations=observations)
+
+
+def write_synthetic_csv(file_path, rows, stations=200, seed=0):
+    """Write rows of 10 minute observations of a few measurands, for stations at fixed positions."""
+    rng = np.random.default_rng(seed)
+    measurands = np.array(["TA", "RH", "WS", "WD", "PA"])
+    units = np.array(["degC", "%", "m/s", "deg", "hPa"])
+    row = np.arange(rows)
+    station = row % stations
+    measurand = row // stations % len(measurands)
+    times = np.datetime64("2022-12-31T00:00") + row // (stations * len(measurands)) * np.timedelta64(10, "m")
+    values = np.round(rng.normal(10, 5, size=rows), 1)
+    values[rng.random(rows) < 0.01] = np.nan
+    pd.DataFrame(
+        {
+            "STATION_ID": 100000 + station,
+            "MEASURAND_CODE": measurands[measurand],
+            "DATA_TIME": pd.to_datetime(times).strftime("%Y%m%d %H:%M:%S"),
+            "DATA_VALUE": values,
+            "MEASURAND_UNIT": units[measurand],
+            "LATITUDE": np.round(60 + station / 100, 4),
+            "LONGITUDE": np.round(20 + station / 50, 4),
+        }
+    ).to_csv(file_path, index=False)
+
+
+def timed(make_requests, file_path):
+    start = perf_counter()
+    observations = sum(len(request.observations) for request in make_requests(file_path))
+    return perf_counter() - start, observations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("file_path", nargs="?")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="Rows of the synthetic file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = args.file_path
+        if file_path is None:
+            file_path = Path(directory) / "synthetic.csv"
+            write_synthetic_csv(file_path, args.rows)
+
+        old, observations = timed(per_row_requests, file_path)
+        new, _ = timed(csv_file_to_requests, file_path)
+    print(f"{observations} observations")
+    print(f"per row:    {old:.3f}s ({observations / old:.0f} obs/s)")
+    print(f"vectorized: {new:.3f}s ({observations / new:.0f} obs/s, {old / new:.1f}x)")
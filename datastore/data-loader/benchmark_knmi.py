@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Benchmark of building the PutObsRequests of a KNMI NetCDF file, without sending them, and of the size of
+# the requests with the time series metadata per observation or per time series (LOADERNORMALIZED).
+# Run from this directory (after generating the protobuf code) with e.g.:
+#   PYTHONPATH=.. python benchmark_knmi.py ../test-data/KNMI/20221231.nc
+import argparse
+import math
+import uuid
+from time import perf_counter
+
+import datastore_pb2 as dstore
+import pandas as pd
+import xarray as xr
+from client_knmi_station import netcdf_file_to_requests
+from google.protobuf.timestamp_pb2 import Timestamp
+from parameters import knmi_parameter_names
+
+
+def per_observation_requests(file_path):
+    """The request building as done before vectorizing: a station slice, and Python objects per value."""
+    with xr.open_dataset(file_path, engine="netcdf4", chunks=None) as file:
+        for station_id, latitude, longitude in zip(
+            file["station"].values, file["lat"].values[0], file["lon"].values[0]
+        ):
+            observations = []
+            station_slice = file.sel(station=station_id)
+            for param_id in knmi_parameter_names:
+                param_file = station_slice[param_id]
+                ts_mdata = dstore.TSMetadata(
+                    platform=station_id,
+                    instrument=param_id,
+                    title=param_file.long_name,
+                    standard_name=param_file.standard_name if "standard_name" in param_file.attrs else None,
+                    unit=param_file.units if "units" in param_file.attrs else None,
+                )
+                for time, obs_value in zip(pd.to_datetime(param_file["time"].data).to_pydatetime(), param_file.data):
+                    ts = Timestamp()
+                    ts.FromDatetime(time)
+                    if not math.isnan(obs_value):
+                        obs_mdata = dstore.ObsMetadata(
+                            id=str(uuid.uuid4()),
+                            geo_point=dstore.Point(lat=latitude, lon=longitude),
+                            obstime_instant=ts,
+                            value=str(obs_value),
+                        )
+                        observations.append(dstore.Metadata1(ts_mdata=ts_mdata, obs_mdata=obs_mdata))
+            if len(observations) > 0:
+                yield dstore.PutObsRequest(observations=observations)
+
+
+def serialized_size(repeat, file_path, normalized):
+    """The bytes of the requests, and the best time of building and serializing them."""
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        size = sum(
+            len(request.SerializeToString()) for request in netcdf_file_to_requests(file_path, normalized=normalized)
+        )
+        timings.append(perf_counter() - start)
+    return size, min(timings)
+
+
+def best_of(repeat, make_requests, file_path):
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        observations = sum(len(request.observations) for request in make_requests(file_path))
+        timings.append(perf_counter() - start)
+    return min(timings), observations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("file_path")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    old, observations = best_of(args.repeat, per_observation_requests, args.file_path)
+    new, _ = best_of(args.repeat, netcdf_file_to_requests, args.file_path)
+    print(f"{observations} observations")
+    print(f"per observation: {old:.3f}s ({observations / old:.0f} obs/s)")
+    print(f"vectorized:      {new:.3f}s ({observations / new:.0f} obs/s, {old / new:.1f}x)")
+
+    denormalized_size, denormalized = serialized_size(args.repeat, args.file_path, normalized=False)
+    normalized_size, normalized = serialized_size(args.repeat, args.file_path, normalized=True)
+    print("building and serializing:")
+    print(f"per observation metadata: {denormalized_size / 1e6:.1f}MB in {denormalized:.3f}s")
+    print(
+        f"per time series metadata: {normalized_size / 1e6:.1f}MB in {normalized:.3f}s"
+        f" ({denormalized_size / normalized_size:.1f}x smaller, {denormalized / normalized:.1f}x faster)"
+    )
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+# File in which the loaders keep their progress, so loading again skips what is already stored. Empty to not keep it
+MANIFEST_PATH = os.getenv("LOADERMANIFEST", "loader_manifest.json")
+
+
+def file_hash(file_path: Path | str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        while chunk := file.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Progress of loading files: per file its content hash, and how many of its requests are stored.
+
+    Requests are counted in the order in which the loader builds them from the file, which is the
+    same every time for the same content. A file whose content changed is loaded from the start.
+    Only content_hash may be called from another thread than the other methods.
+    """
+
+    def __init__(self, path: Path | str | None = MANIFEST_PATH):
+        self.path = Path(path) if path else None
+        self.files = json.loads(self.path.read_text()) if self.path and self.path.exists() else {}
+
+    @staticmethod
+    def _key(file_path: Path | str) -> str:
+        return str(Path(file_path).resolve())
+
+    def content_hash(self, file_path: Path | str) -> str | None:
+        """The hash of the file for requests_done, None if no manifest is kept. Takes a while for large files."""
+        return file_hash(file_path) if self.path is not None else None
+
+    def requests_done(self, file_path: Path | str, content_hash: str | None = None) -> int | None:
+        """The number of leading requests of the file that are already stored, or None if all of them are.
+
+        content_hash is that of the file from content_hash, which is computed here if not given.
+        """
+        if self.path is None:
+            return 0
+        key = self._key(file_path)
+        content_hash = content_hash or file_hash(file_path)
+        entry = self.files.get(key)
+        if entry is None or entry["sha256"] != content_hash:
+            entry = self.files[key] = {"sha256": content_hash, "requests": 0, "complete": False}
+        return None if entry["complete"] else entry["requests"]
+
+    def acknowledged(self, file_path: Path | str, requests: int):
+        """Record that the first requests of the file are stored, after requests_done was called for it."""
+        if self.path is not None:
+            self.files[self._key(file_path)]["requests"] = requests
+            self.save()
+
+    def completed(self, file_path: Path | str):
+        if self.path is not None:
+            self.files[self._key(file_path)]["complete"] = True
+            self.save()
+
+    def save(self):
+        # Write a new file and rename it, so a crash while saving doesn't lose the manifest
+        new_path = self.path.with_name(self.path.name + ".new")
+        new_path.write_text(json.dumps(self.files, indent=2))
+        os.replace(new_path, self.path)
@@ -1,88 +1,128 @@
 #!/usr/bin/env python3
 # tested with Python 3.11
-import concurrent
+import argparse
 import os
 import uuid
-from datetime import datetime
-from multiprocessing import cpu_count
+from contextlib import nullcontext
 from pathlib import Path
 from time import perf_counter
-from typing import List
-from typing import Tuple
+from typing import Iterator
 
 import datastore_pb2 as dstore
-import datastore_pb2_grpc as dstore_grpc
-import grpc
+import numpy as np
 import pandas as pd
-from google.protobuf.timestamp_pb2 import Timestamp
-
-
-def csv_file_to_requests(file_path: Path | str) -> Tuple[List, List]:
-    time_format = "%Y%m%d %H:%M:%S"
-    observation_request_messages = []
-    ts_mdata = None
-    obs_mdata = None
-
-    # Read the CSV file into a pandas DataFrame
-    df = pd.read_csv(file_path, encoding="iso-8859-15", encoding_errors="replace")
+from checkpoint import Manifest
+from loader import find_files
+from loader import load_files
+from loader import NORMALIZED
+from process_pool import build_in_processes
+from process_pool import process_pool
+
+
+# Number of processes building requests, 1 to build them in the main process
+PROCESSES = int(os.getenv("LOADERPROCESSES", "1"))
+# Number of CSV rows read at a time
+CHUNK_ROWS = int(os.getenv("CSVCHUNKROWS", "1000000"))
+
+TIME_FORMAT = "%Y%m%d %H:%M:%S"
+# The columns that are the same for all observations of a time series
+GROUP_COLUMNS = ["STATION_ID", "MEASURAND_CODE", "MEASURAND_UNIT", "LATITUDE", "LONGITUDE"]
+
+
+def read_csv_chunks(file_path: Path | str, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Yield the rows of the file chunk_rows at a time, which keeps memory use bounded for files larger than memory."""
+    with pd.read_csv(
+        file_path,
+        encoding="iso-8859-15",
+        encoding_errors="replace",
+        usecols=[*GROUP_COLUMNS, "DATA_TIME", "DATA_VALUE"],
+        dtype={"DATA_TIME": str},
+        chunksize=chunk_rows,
+    ) as chunks:
+        yield from chunks
+
+
+def csv_file_to_requests(
+    file_path: Path | str, chunk_rows: int = CHUNK_ROWS, normalized: bool = NORMALIZED
+) -> Iterator[dstore.PutObsRequest]:
+    """Yield a PutObsRequest per station in each chunk of chunk_rows rows of the file, see chunk_to_requests."""
+    for df in read_csv_chunks(file_path, chunk_rows):
+        yield from chunk_to_requests(df, normalized)
+
+
+def chunk_to_requests(df: pd.DataFrame, normalized: bool = NORMALIZED) -> Iterator[dstore.PutObsRequest]:
+    """Yield a PutObsRequest per station in a chunk of rows of a file.
+
+    Duplicate observations are only dropped within a chunk, the datastore keeps the last of any
+    others. If normalized, the observations are given per time series.
+    """
     df.dropna(subset=["DATA_VALUE"], inplace=True)
     df = df.drop_duplicates(subset=["STATION_ID", "MEASURAND_CODE", "DATA_TIME"])
     df.fillna("None", inplace=True)
-    df = df.groupby("STATION_ID")
-    for i, r in df:
-        observations = []
-        for i, r in r.iterrows():
-            ts_mdata = dstore.TSMetadata(
-                platform=str(r["STATION_ID"]),
-                instrument=str(r["MEASURAND_CODE"]),
-                title="FMI test data",
-                standard_name=str(r["MEASURAND_CODE"]),
-                unit=r["MEASURAND_UNIT"],
-            )
-
-            ts = Timestamp()
-
-            ts.FromDatetime(datetime.strptime(r["DATA_TIME"], time_format))
-
-            obs_mdata = dstore.ObsMetadata(
-                id=str(uuid.uuid4()),
-                geo_point=dstore.Point(lat=r["LATITUDE"], lon=r["LONGITUDE"]),
-                obstime_instant=ts,
-                value=str(r["DATA_VALUE"]),  # TODO: Store float in DB
-            )
-
-            observations.append(dstore.Metadata1(ts_mdata=ts_mdata, obs_mdata=obs_mdata))
 
-        observation_request_messages.append(dstore.PutObsRequest(observations=observations))
-
-    return observation_request_messages
-
-
-def insert_data(observation_request_messages: List):
-    workers = int(cpu_count())
-
-    with grpc.insecure_channel(f"{os.getenv('DSHOST', 'localhost')}:{os.getenv('DSPORT', '50050')}") as channel:
-        client = dstore_grpc.DatastoreStub(channel=channel)
-        print(f"Inserting {len(observation_request_messages)} bulk observations requests.")
-        obs_insert_start = perf_counter()
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            for _ in executor.map(client.PutObservations, observation_request_messages):
-                pass
-        print(f"Finished observations bulk insert {perf_counter() - obs_insert_start}.")
+    # Convert the times and values of all rows at once
+    times = pd.to_datetime(df["DATA_TIME"], format=TIME_FORMAT).values.astype("datetime64[ns]")
+    seconds, nanos = np.divmod(times.astype(np.int64), 1_000_000_000)
+    values = df["DATA_VALUE"].to_numpy()
+
+    request, request_station = None, None
+    # The groups are the time series, sorted by station
+    for (station_id, measurand, unit, latitude, longitude), rows in df.groupby(GROUP_COLUMNS).indices.items():
+        if station_id != request_station:
+            if request is not None:
+                yield request
+            request, request_station = dstore.PutObsRequest(), station_id
+
+        ts_mdata = dstore.TSMetadata(
+            platform=str(station_id),
+            instrument=str(measurand),
+            title="FMI test data",
+            standard_name=str(measurand),
+            unit=unit,
+        )
+        geo_point = dstore.Point(lat=latitude, lon=longitude)
+        # Fields shared by all observations of the time series, merged into each observation
+        if normalized:
+            add_observation = request.series.add(ts_mdata=ts_mdata).obs_mdata.add
+            template = dstore.ObsMetadata(geo_point=geo_point)
+        else:
+            add_observation = request.observations.add
+            template = dstore.Metadata1(ts_mdata=ts_mdata, obs_mdata=dstore.ObsMetadata(geo_point=geo_point))
+        for obs_seconds, obs_nanos, obs_value in zip(
+            seconds[rows].tolist(), nanos[rows].tolist(), values[rows].tolist()
+        ):
+            observation = add_observation()
+            observation.MergeFrom(template)
+            obs_mdata = observation if normalized else observation.obs_mdata
+            obs_mdata.id = str(uuid.uuid4())
+            obs_mdata.obstime_instant.seconds = obs_seconds
+            obs_mdata.obstime_instant.nanos = obs_nanos
+            obs_mdata.value = str(obs_value)  # TODO: Store float in DB
+
+    if request is not None:
+        yield request
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=[str(Path(__file__).parents[2] / "test-data" / "FMI" / "20221231.csv")],
+        help="CSV files, directories or glob patterns",
+    )
+    args = parser.parse_args()
     total_time_start = perf_counter()
 
-    print("Starting with creating the time series and observations requests.")
-    create_requests_start = perf_counter()
-    file_path = Path(Path(__file__).parents[2] / "test-data" / "FMI" / "20221231.csv")
-    print(file_path)
-    observation_request_messages = csv_file_to_requests(file_path=file_path)
-    print("Finished creating the time series and observation requests " f"{perf_counter() - create_requests_start}.")
+    # The requests are created while inserting them
+    def make_requests(file_path):
+        if PROCESSES > 1:
+            # Build the requests of the chunks of rows in parallel, as building them is CPU bound
+            return build_in_processes(pool, chunk_to_requests, ((df,) for df in read_csv_chunks(file_path)), PROCESSES)
+        return csv_file_to_requests(file_path=file_path)
 
-    insert_data(
-        observation_request_messages=observation_request_messages,
-    )
+    # Created up front in the main thread, and shared by all files
+    with process_pool(PROCESSES) if PROCESSES > 1 else nullcontext() as pool:
+        load_files(find_files(args.paths, ".csv"), make_requests, Manifest())
 
     print(f"Finished, total time elapsed: {perf_counter() - total_time_start}")
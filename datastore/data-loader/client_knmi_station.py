@@ -1,91 +1,115 @@
 #!/usr/bin/env python3
 # tested with Python 3.11
-import concurrent
-import math
+import argparse
 import os
 import uuid
-from multiprocessing import cpu_count
+from contextlib import nullcontext
 from pathlib import Path
 from time import perf_counter
-from typing import List
-from typing import Tuple
+from typing import Iterator
 
 import datastore_pb2 as dstore
-import datastore_pb2_grpc as dstore_grpc
-import grpc
-import pandas as pd
+import numpy as np
 import xarray as xr
-from google.protobuf.timestamp_pb2 import Timestamp
+from checkpoint import Manifest
+from loader import find_files
+from loader import load_files
+from loader import NORMALIZED
 from parameters import knmi_parameter_names
+from process_pool import build_in_processes
+from process_pool import process_pool
 
 
-def netcdf_file_to_requests(file_path: Path | str) -> Tuple[List, List]:
-    observation_request_messages = []
+# Number of processes building requests, 1 to build them in the main process
+PROCESSES = int(os.getenv("LOADERPROCESSES", "1"))
 
+
+def netcdf_file_to_requests(
+    file_path: Path | str, stations: slice = slice(None), normalized: bool = NORMALIZED
+) -> Iterator[dstore.PutObsRequest]:
+    """Yield a PutObsRequest per station, so the requests can be sent while the rest of the file is read.
+
+    Only the stations in the given slice of the station axis are read, e.g. to build the requests of
+    one file in several processes. If normalized, the observations are given per time series.
+    """
     with xr.open_dataset(file_path, engine="netcdf4", chunks=None) as file:  # chunks=None to disable dask
-        for station_id, latitude, longitude, height in zip(
-            file["station"].values,
-            file["lat"].values[0],
-            file["lon"].values[0],
-            file["height"].values[0],
-        ):
-            observations = []
-            station_slice = file.sel(station=station_id)
+        # The time axis is shared by all stations and parameters, so convert it once
+        seconds, nanos = np.divmod(file["time"].values.astype("datetime64[ns]").astype(np.int64), 1_000_000_000)
+        # Values of each parameter as (station, time) arrays, and the parameter attributes in TSMetadata form
+        values = {param_id: file[param_id].isel(station=stations).values for param_id in knmi_parameter_names}
+        ts_attrs = {
+            param_id: dict(
+                instrument=param_id,
+                title=file[param_id].long_name,
+                standard_name=file[param_id].attrs.get("standard_name"),
+                unit=file[param_id].attrs.get("units"),
+            )
+            for param_id in knmi_parameter_names
+        }
+
+        latitudes = file["lat"].values[0][stations]
+        longitudes = file["lon"].values[0][stations]
+        for station_index, station_id in enumerate(file["station"].values[stations]):
+            request = dstore.PutObsRequest()
+            geo_point = dstore.Point(lat=latitudes[station_index], lon=longitudes[station_index])
 
             for param_id in knmi_parameter_names:
-                # print(station_id, param_id)
-                param_file = station_slice[param_id]
-                ts_mdata = dstore.TSMetadata(
-                    platform=station_id,
-                    instrument=param_id,
-                    title=param_file.long_name,
-                    standard_name=param_file.standard_name if "standard_name" in param_file.attrs else None,
-                    unit=param_file.units if "units" in param_file.attrs else None,
-                )
-
-                for time, obs_value in zip(pd.to_datetime(param_file["time"].data).to_pydatetime(), param_file.data):
-                    ts = Timestamp()
-                    ts.FromDatetime(time)
-                    if not math.isnan(obs_value):  # Stations that don't have a parameter give them all as nan
-                        obs_mdata = dstore.ObsMetadata(
-                            id=str(uuid.uuid4()),
-                            geo_point=dstore.Point(lat=latitude, lon=longitude),
-                            obstime_instant=ts,
-                            value=str(obs_value),  # TODO: Store float in DB
-                        )
-                        observations.append(dstore.Metadata1(ts_mdata=ts_mdata, obs_mdata=obs_mdata))
-
-            if len(observations) > 0:
-                observation_request_messages.append(dstore.PutObsRequest(observations=observations))
-
-    return observation_request_messages
-
-
-def insert_data(observation_request_messages: List):
-    workers = int(cpu_count())
-
-    with grpc.insecure_channel(f"{os.getenv('DSHOST', 'localhost')}:{os.getenv('DSPORT', '50050')}") as channel:
-        client = dstore_grpc.DatastoreStub(channel=channel)
-
-        print(f"Inserting {len(observation_request_messages)} bulk observations requests.")
-        obs_insert_start = perf_counter()
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            for _ in executor.map(client.PutObservations, observation_request_messages):
-                pass
-        print(f"Finished observations bulk insert {perf_counter() - obs_insert_start}.")
+                station_values = values[param_id][station_index]
+                has_value = ~np.isnan(station_values)  # Stations that don't have a parameter give them all as nan
+                if not has_value.any():
+                    continue
+
+                ts_mdata = dstore.TSMetadata(platform=station_id, **ts_attrs[param_id])
+                # Fields shared by all observations of the time series, merged into each observation
+                if normalized:
+                    add_observation = request.series.add(ts_mdata=ts_mdata).obs_mdata.add
+                    template = dstore.ObsMetadata(geo_point=geo_point)
+                else:
+                    add_observation = request.observations.add
+                    template = dstore.Metadata1(ts_mdata=ts_mdata, obs_mdata=dstore.ObsMetadata(geo_point=geo_point))
+                for obs_seconds, obs_nanos, obs_value in zip(
+                    seconds[has_value].tolist(), nanos[has_value].tolist(), station_values[has_value].tolist()
+                ):
+                    observation = add_observation()
+                    observation.MergeFrom(template)
+                    obs_mdata = observation if normalized else observation.obs_mdata
+                    obs_mdata.id = str(uuid.uuid4())
+                    obs_mdata.obstime_instant.seconds = obs_seconds
+                    obs_mdata.obstime_instant.nanos = obs_nanos
+                    obs_mdata.value = str(obs_value)  # TODO: Store float in DB
+
+            if request.observations or request.series:
+                yield request
+
+
+def station_groups(file_path: Path | str, groups: int) -> list[tuple]:
+    """Split the stations of a file in about equal groups, as (file_path, stations) tasks for build_in_processes."""
+    with xr.open_dataset(file_path, engine="netcdf4", chunks=None) as file:
+        station_count = file.sizes["station"]
+    size = -(-station_count // groups)
+    return [(file_path, slice(start, start + size)) for start in range(0, station_count, size)]
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=[str(Path(__file__).parents[2] / "test-data" / "KNMI" / "20221231.nc")],
+        help="NetCDF files, directories or glob patterns",
+    )
+    args = parser.parse_args()
     total_time_start = perf_counter()
 
-    print("Starting with creating the time series and observations requests.")
-    create_requests_start = perf_counter()
-    file_path = Path(Path(__file__).parents[2] / "test-data" / "KNMI" / "20221231.nc")
-    observation_request_messages = netcdf_file_to_requests(file_path=file_path)
-    print("Finished creating the time series and observation requests " f"{perf_counter() - create_requests_start}.")
+    # The requests are created while inserting them
+    def make_requests(file_path):
+        if PROCESSES > 1:
+            # Build the requests of groups of stations in parallel, as building them is CPU bound
+            return build_in_processes(pool, netcdf_file_to_requests, station_groups(file_path, PROCESSES), PROCESSES)
+        return netcdf_file_to_requests(file_path=file_path)
 
-    insert_data(
-        observation_request_messages=observation_request_messages,
-    )
+    # Created up front in the main thread, and shared by all files
+    with process_pool(PROCESSES) if PROCESSES > 1 else nullcontext() as pool:
+        load_files(find_files(args.paths, ".nc"), make_requests, Manifest())
 
     print(f"Finished, total time elapsed: {perf_counter() - total_time_start}")
@@ -0,0 +1,102 @@
+import asyncio
+import glob
+import os
+from itertools import islice
+from pathlib import Path
+from time import perf_counter
+from typing import Callable
+from typing import Iterable
+
+from checkpoint import Manifest
+from dsclient import insecure_channel
+from dsclient import Progress
+from dsclient import send
+
+
+# Number of files loaded at a time
+FILES = int(os.getenv("LOADERFILES", "2"))
+# Number of PutObservations calls in flight at a time, for all files together
+WINDOW = int(os.getenv("LOADERWINDOW", "8"))
+# Send the time series metadata once per time series (PutObsRequest.series) rather than per observation
+NORMALIZED = os.getenv("LOADERNORMALIZED", "false").lower() == "true"
+
+
+def find_files(paths: Iterable[str], suffix: str) -> list[Path]:
+    """The files with the suffix in the given files, directories (recursively) or glob patterns.
+
+    The files are sorted by name, which for daily files like 20221231.nc is in order of time.
+    """
+    found = set()
+    for path in paths:
+        if Path(path).is_dir():
+            found.update(Path(path).rglob(f"*{suffix}"))
+        elif glob.has_magic(path):
+            found.update(Path(match) for match in glob.glob(path, recursive=True) if match.endswith(suffix))
+        elif Path(path).is_file():
+            found.add(Path(path))
+        else:
+            raise FileNotFoundError(f"No such file, directory or pattern: {path}")
+    return sorted(found, key=lambda file_path: (file_path.name, str(file_path)))
+
+
+async def _load_file(
+    file_path: Path,
+    make_requests: Callable[[Path], Iterable],
+    manifest: Manifest,
+    channel,
+    window: asyncio.Semaphore,
+    progress: Progress,
+):
+    # Hashing large files takes a while, so it is done in a thread, but the manifest is only updated on the
+    # event loop, where it is also saved while other files are loading
+    done = manifest.requests_done(file_path, await asyncio.to_thread(manifest.content_hash, file_path))
+    if done is None:
+        print(f"Skipping {file_path}, which is already loaded.")
+        return
+    print(f"Loading {file_path}" + (f", after the {done} requests loaded before." if done else "."))
+    start = perf_counter()
+    await send(
+        islice(make_requests(file_path), done, None),
+        channel,
+        window,
+        progress,
+        on_acknowledged=lambda requests: manifest.acknowledged(file_path, done + requests),
+    )
+    manifest.completed(file_path)
+    print(f"Finished {file_path} in {perf_counter() - start:.1f}s.")
+
+
+async def _load_files(file_paths, make_requests, manifest, files, window):
+    progress = Progress()
+    window = asyncio.Semaphore(window)
+    files = asyncio.Semaphore(files)
+
+    async def load_file(file_path):
+        async with files:
+            await _load_file(file_path, make_requests, manifest, channel, window, progress)
+
+    async with insecure_channel(aio=True) as channel:
+        # The semaphores let the tasks start in order, so the files are loaded in order of time
+        await asyncio.gather(*(load_file(file_path) for file_path in file_paths))
+    return progress
+
+
+def load_files(
+    file_paths: list[Path],
+    make_requests: Callable[[Path], Iterable],
+    manifest: Manifest,
+    files: int = FILES,
+    window: int = WINDOW,
+):
+    """Insert the requests that make_requests builds from each file, loading several files at a time.
+
+    All files share the window of calls in flight, and at most files files are read at a time, which
+    bounds the memory used however many files there are. Requests that the manifest has as stored
+    are skipped, and the progress is recorded in it.
+    """
+    print(f"Loading {len(file_paths)} files.")
+    progress = asyncio.run(_load_files(file_paths, make_requests, manifest, files, window))
+    print(
+        f"Finished {progress.calls} observations bulk inserts {perf_counter() - progress.start}"
+        f" ({progress.observations} observations, {progress.rate():.0f} obs/s)."
+    )
@@ -0,0 +1,54 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+
+from dsclient import observation_count
+
+
+def serialize_requests(make_requests: Callable, *args) -> list[tuple[bytes, int]]:
+    # Serialized messages are much cheaper to send back to the parent process than pickled ones
+    return [(request.SerializeToString(), observation_count(request)) for request in make_requests(*args)]
+
+
+@contextmanager
+def process_pool(processes: int) -> Iterator[ProcessPoolExecutor]:
+    """A pool of processes for build_in_processes, to share by all files being loaded.
+
+    Create it in the main thread before loading starts. The processes are spawned rather than
+    forked, as a process forked while gRPC, asyncio or another pool have threads running can
+    deadlock on a lock that one of those threads held. Tasks that have not started yet are
+    cancelled on exit, so a failed load doesn't wait for requests that will never be sent.
+    """
+    executor = ProcessPoolExecutor(max_workers=processes, mp_context=get_context("spawn"))
+    try:
+        yield executor
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def build_in_processes(
+    executor: ProcessPoolExecutor, make_requests: Callable, tasks: Iterable[tuple], processes: int
+) -> Iterator[tuple[bytes, int]]:
+    """Run make_requests(*task) for each task in the pool of processes, and yield the serialized requests.
+
+    Requests are yielded as (bytes, observation count), in task order, so in the same order as
+    building them in a single process. At most two tasks per process are submitted at a time,
+    which bounds the memory used for requests that are built but not yet consumed. make_requests
+    must be a module level function, so it can be pickled.
+    """
+    pending = deque()
+    try:
+        for task in tasks:
+            pending.append(executor.submit(serialize_requests, make_requests, *task))
+            if len(pending) >= 2 * processes:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        # E.g. when the file is abandoned after a failed call
+        for future in pending:
+            future.cancel()
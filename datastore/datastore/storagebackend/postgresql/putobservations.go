@@ -391,16 +391,19 @@ func (sbe *PostgreSQL) PutObservations(request *datastore.PutObsRequest) error {
 	loTime, hiTime := common.GetValidTimeRange()
 
 	// reject call if # of observations exceeds limit
-	if len(request.Observations) > putObsLimit {
+	obsCount := len(request.Observations)
+	for _, series := range request.Series {
+		obsCount += len(series.GetObsMdata())
+	}
+	if obsCount > putObsLimit {
 		return fmt.Errorf(
-			"too many observations in a single call: %d > %d",
-			len(request.Observations), putObsLimit)
+			"too many observations in a single call: %d > %d", obsCount, putObsLimit)
 	}
 
-	// populate tsInfos
-	for _, obs := range request.Observations {
+	// addObs adds an observation to tsInfos, getting the ID of its time series with getTSID.
+	addObs := func(getTSID func() (int64, error), obsMdata *datastore.ObsMetadata) error {
 
-		obsTime, err := getObsTime(obs.GetObsMdata())
+		obsTime, err := getObsTime(obsMdata)
 		if err != nil {
 			return fmt.Errorf("getObsTime() failed: %v", err)
 		}
@@ -417,12 +420,12 @@ func (sbe *PostgreSQL) PutObservations(request *datastore.PutObsRequest) error {
 				obsTime.AsTime(), hiTime, loTime, common.GetValidTimeRangeSettings())
 		}
 
-		tsID, err := getTimeSeriesID(sbe.Db, obs.GetTsMdata(), tsIDCache)
+		tsID, err := getTSID()
 		if err != nil {
 			return fmt.Errorf("getTimeSeriesID() failed: %v", err)
 		}
 
-		gpID, err := getGeoPointID(sbe.Db, obs.GetObsMdata().GetGeoPoint(), gpIDCache)
+		gpID, err := getGeoPointID(sbe.Db, obsMdata.GetGeoPoint(), gpIDCache)
 		if err != nil {
 			return fmt.Errorf("getGeoPointID() failed: %v", err)
 		}
@@ -446,7 +449,39 @@ func (sbe *PostgreSQL) PutObservations(request *datastore.PutObsRequest) error {
 		}
 		*tsInfo0.obsTimes = append(*tsInfo0.obsTimes, obsTime)
 		*tsInfo0.gpIDs = append(*tsInfo0.gpIDs, gpID)
-		*tsInfo0.omds = append(*tsInfo0.omds, obs.GetObsMdata())
+		*tsInfo0.omds = append(*tsInfo0.omds, obsMdata)
+
+		return nil
+	}
+
+	// populate tsInfos
+	for _, obs := range request.Observations {
+		getTSID := func() (int64, error) {
+			return getTimeSeriesID(sbe.Db, obs.GetTsMdata(), tsIDCache)
+		}
+		if err := addObs(getTSID, obs.GetObsMdata()); err != nil {
+			return err
+		}
+	}
+
+	// the time series ID of normalized observations is looked up only once per time series
+	for _, series := range request.Series {
+		var tsID int64 = -1
+		getTSID := func() (int64, error) {
+			if tsID == -1 {
+				id, err := getTimeSeriesID(sbe.Db, series.GetTsMdata(), tsIDCache)
+				if err != nil {
+					return -1, err
+				}
+				tsID = id
+			}
+			return tsID, nil
+		}
+		for _, obsMdata := range series.GetObsMdata() {
+			if err := addObs(getTSID, obsMdata); err != nil {
+				return err
+			}
+		}
 	}
 
 	// insert/update observations for each time series
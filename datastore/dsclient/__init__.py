@@ -0,0 +1,77 @@
+"""Python client of the datastore, shared by the API, the data loaders, the examples and the tests.
+
+See README.md for how to use it.
+"""
+from .batching import Batch
+from .batching import Batcher
+from .batching import observation_count
+from .batching import put_serialized
+from .batching import to_series
+from .channel import add_call_hook
+from .channel import call_with_retries
+from .channel import call_with_retries_async
+from .channel import CHANNEL_OPTIONS
+from .channel import ChannelPool
+from .channel import insecure_channel
+from .get import iter_chunks
+from .get import iter_chunks_async
+from .get import iter_observations
+from .get import merge_responses
+from .get import split_request
+from .messages import polygon
+from .messages import time_interval
+from .messages import timestamp
+from .sender import Progress
+from .sender import put_observations
+from .sender import send
+
+__all__ = [
+    "Batch",
+    "Batcher",
+    "observation_count",
+    "put_serialized",
+    "to_series",
+    "add_call_hook",
+    "call_with_retries",
+    "call_with_retries_async",
+    "CHANNEL_OPTIONS",
+    "ChannelPool",
+    "insecure_channel",
+    "concat_series",
+    "decode_positions",
+    "decode_response",
+    "decode_times",
+    "decode_values",
+    "SeriesArrays",
+    "to_table",
+    "iter_chunks",
+    "iter_chunks_async",
+    "iter_observations",
+    "merge_responses",
+    "split_request",
+    "polygon",
+    "time_interval",
+    "timestamp",
+    "Progress",
+    "put_observations",
+    "send",
+]
+
+# Only imported when used, as the columnar decoding needs NumPy, which the package doesn't require otherwise
+_COLUMNAR = {
+    "concat_series",
+    "decode_positions",
+    "decode_response",
+    "decode_times",
+    "decode_values",
+    "SeriesArrays",
+    "to_table",
+}
+
+
+def __getattr__(name):
+    if name in _COLUMNAR:
+        from . import columnar
+
+        return getattr(columnar, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,165 @@
+import os
+import threading
+from collections import namedtuple
+from typing import Iterable
+from typing import Iterator
+
+import datastore_pb2 as dstore
+import grpc
+
+
+# The datastore accepts messages up to the gRPC default of 4MB, and at most PUTOBSLIMIT observations per request
+MAX_MESSAGE_BYTES = 4 * 1024 * 1024
+BATCH_BYTES = int(os.getenv("BATCHBYTES", str(3 * 1024 * 1024)))
+BATCH_OBSERVATIONS = int(os.getenv("PUTOBSLIMIT", "100000"))
+# Target duration of a PutObservations call, to which the batch size is tuned. 0 to always use BATCHBYTES
+BATCH_SECONDS = float(os.getenv("BATCHSECONDS", "2.0"))
+MIN_BATCH_BYTES = 64 * 1024
+
+# Numbers of the (length delimited) fields in a serialized PutObsRequest and Metadata2
+_OBSERVATIONS_FIELD = 1
+_SERIES_FIELD = 2
+_TS_MDATA_FIELD = 1
+_OBS_MDATA_FIELD = 2
+
+
+# A serialized PutObsRequest, with its number of observations and the number of items it completes
+Batch = namedtuple("Batch", ["data", "observations", "items"])
+
+
+def _varint(value: int) -> bytes:
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append(value & 0x7F | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _field(number: int, serialized: bytes) -> bytes:
+    return _varint(number << 3 | 2) + _varint(len(serialized)) + serialized
+
+
+def observation_count(request: dstore.PutObsRequest) -> int:
+    return len(request.observations) + sum(len(series.obs_mdata) for series in request.series)
+
+
+def to_series(observations: Iterable[dstore.Metadata1]) -> list[dstore.Metadata2]:
+    """Group observations by time series, so the time series metadata is sent once per time series.
+
+    The time series are in order of their first observation.
+    """
+    series = {}
+    for observation in observations:
+        key = observation.ts_mdata.SerializeToString(deterministic=True)
+        if key not in series:
+            series[key] = dstore.Metadata2(ts_mdata=observation.ts_mdata)
+        series[key].obs_mdata.append(observation.obs_mdata)
+    return list(series.values())
+
+
+class Batcher:
+    """Pack observations into serialized PutObsRequests that the datastore accepts.
+
+    A serialized PutObsRequest is the concatenation of its serialized observations and time series,
+    so requests are packed by joining bytes rather than copying messages. Each batch stays below the target size and
+    at most max_observations. With target_seconds, the target size follows the throughput reported
+    with observe(), so a call takes about that long, between MIN_BATCH_BYTES and max_bytes.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = BATCH_BYTES,
+        max_observations: int = BATCH_OBSERVATIONS,
+        target_seconds: float = BATCH_SECONDS,
+    ):
+        if max_bytes >= MAX_MESSAGE_BYTES:
+            raise ValueError(f"The batch size must be below the message size limit of {MAX_MESSAGE_BYTES} bytes")
+        self.max_bytes = max_bytes
+        self.max_observations = max_observations
+        self.target_seconds = target_seconds
+        self.target_bytes = max_bytes
+        self._bytes_per_second = None
+        self._lock = threading.Lock()
+
+    def observe(self, size: int, seconds: float):
+        """Report that sending a batch of size bytes took seconds, to tune the size of the next batches."""
+        if not self.target_seconds or seconds <= 0:
+            return
+        with self._lock:
+            rate = size / seconds
+            if self._bytes_per_second is not None:
+                # Smooth the rate, as single calls can be slow for other reasons
+                rate = 0.7 * self._bytes_per_second + 0.3 * rate
+            self._bytes_per_second = rate
+            target = int(self._bytes_per_second * self.target_seconds)
+            self.target_bytes = min(self.max_bytes, max(MIN_BATCH_BYTES, target))
+
+    def _series_parts(self, series: dstore.Metadata2) -> Iterator[tuple[bytes, int, bool]]:
+        # A time series too big for a batch is split in time series with the same metadata
+        ts_mdata = _field(_TS_MDATA_FIELD, series.ts_mdata.SerializeToString())
+        obs_mdata, size = [], len(ts_mdata)
+        for observation in series.obs_mdata:
+            field = _field(_OBS_MDATA_FIELD, observation.SerializeToString())
+            if obs_mdata and (size + len(field) > self.target_bytes or len(obs_mdata) >= self.max_observations):
+                yield _field(_SERIES_FIELD, ts_mdata + b"".join(obs_mdata)), len(obs_mdata), False
+                obs_mdata, size = [], len(ts_mdata)
+            obs_mdata.append(field)
+            size += len(field)
+        yield _field(_SERIES_FIELD, ts_mdata + b"".join(obs_mdata)), len(obs_mdata), True
+
+    def _parts(self, items: Iterable) -> Iterator[tuple[bytes, int, bool]]:
+        # Items are split into (serialized observations, observation count, last part of the item) parts
+        # of at most a full batch
+        for item in items:
+            if isinstance(item, dstore.Metadata1):
+                yield _field(_OBSERVATIONS_FIELD, item.SerializeToString()), 1, True
+                continue
+            if isinstance(item, dstore.Metadata2):
+                yield from self._series_parts(item)
+                continue
+
+            if isinstance(item, dstore.PutObsRequest):
+                request, serialized, count = item, item.SerializeToString(), observation_count(item)
+            else:
+                request, (serialized, count) = None, item
+            if len(serialized) <= self.target_bytes and count <= self.max_observations:
+                yield serialized, count, True
+                continue
+
+            request = request or dstore.PutObsRequest.FromString(serialized)
+            previous = None
+            for part in self._parts([*request.observations, *request.series]):
+                if previous is not None:
+                    # Only the last part of the last observation or time series is the last part of the request
+                    yield previous[0], previous[1], False
+                previous = part
+            yield previous
+
+    def batches(self, items: Iterable) -> Iterator[Batch]:
+        """Yield serialized PutObsRequests with the given observations, in order.
+
+        Items are Metadata1 or Metadata2 messages, PutObsRequest messages, or serialized requests as
+        (bytes, observation count). Each Batch also has the number of items that are completely in
+        it or in the batches before it. Raises ValueError for an observation too big to send at all.
+        """
+        parts, size, count, items_done = [], 0, 0, 0
+        for part, part_count, last in self._parts(items):
+            if len(part) >= MAX_MESSAGE_BYTES:
+                raise ValueError(f"An observation of {len(part)} bytes does not fit in a single request")
+            if parts and (size + len(part) > self.target_bytes or count + part_count > self.max_observations):
+                yield Batch(b"".join(parts), count, items_done)
+                parts, size, count = [], 0, 0
+            parts.append(part)
+            size += len(part)
+            count += part_count
+            items_done += last
+        if parts:
+            yield Batch(b"".join(parts), count, items_done)
+
+
+def put_serialized(channel: grpc.Channel):
+    """PutObservations of the channel, taking a serialized request as made by Batcher.batches."""
+    return channel.unary_unary(
+        "/datastore.Datastore/PutObservations", response_deserializer=dstore.PutObsResponse.FromString
+    )
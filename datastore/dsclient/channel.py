@@ -0,0 +1,156 @@
+import asyncio
+import itertools
+import os
+import random
+import threading
+from time import perf_counter
+from time import sleep
+from typing import Callable
+
+import datastore_pb2_grpc as dstore_grpc
+import grpc
+
+
+DSHOST = os.getenv("DSHOST", "localhost")
+DSPORT = os.getenv("DSPORT", "50050")
+# Default gRPC limit is 4MB, which is easily exceeded by area queries
+MAX_MESSAGE_SIZE = int(os.getenv("DSMAXMESSAGESIZE", str(256 * 1024 * 1024)))
+# Keep this at or above the server enforcement minimum (5 minutes for grpc-go), otherwise the
+# server answers the pings with GOAWAY
+KEEPALIVE_TIME_MS = int(os.getenv("DSKEEPALIVETIMEMS", str(5 * 60 * 1000)))
+# Number of times a call is retried when the datastore is unavailable or overloaded
+RETRIES = int(os.getenv("DSRETRIES", "5"))
+RETRY_CODES = {grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.RESOURCE_EXHAUSTED}
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30.0
+
+CHANNEL_OPTIONS = [
+    ("grpc.max_send_message_length", MAX_MESSAGE_SIZE),
+    ("grpc.max_receive_message_length", MAX_MESSAGE_SIZE),
+    ("grpc.keepalive_time_ms", KEEPALIVE_TIME_MS),
+    ("grpc.keepalive_timeout_ms", 20 * 1000),
+    ("grpc.keepalive_permit_without_calls", 0),
+    # Without this, channels with identical arguments share a single subchannel (connection),
+    # which defeats the point of having a pool
+    ("grpc.use_local_subchannel_pool", 1),
+]
+
+# Functions called with (method, seconds, status code) after every call
+_call_hooks: list[Callable[[str, float, grpc.StatusCode], None]] = []
+
+
+def add_call_hook(hook: Callable[[str, float, grpc.StatusCode], None]):
+    """Call hook with the method name (e.g. "GetObservations"), duration and status code of every call.
+
+    Only the channels opened after adding the first hook are timed, so that the others don't pay
+    for an interceptor.
+    """
+    _call_hooks.append(hook)
+
+
+def _report(method: str | bytes, start: float, code: grpc.StatusCode):
+    seconds = perf_counter() - start
+    method = (method.decode() if isinstance(method, bytes) else method).rsplit("/", 1)[-1]
+    for hook in _call_hooks:
+        hook(method, seconds, code)
+
+
+class _TimingInterceptor(grpc.UnaryUnaryClientInterceptor):
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        start = perf_counter()
+        outcome = continuation(client_call_details, request)
+        outcome.add_done_callback(lambda outcome: _report(client_call_details.method, start, outcome.code()))
+        return outcome
+
+
+class _AioTimingInterceptor(grpc.aio.UnaryUnaryClientInterceptor):
+    async def intercept_unary_unary(self, continuation, client_call_details, request):
+        start = perf_counter()
+        code = grpc.StatusCode.CANCELLED
+        try:
+            call = await continuation(client_call_details, request)
+            await call
+            code = grpc.StatusCode.OK
+            return call
+        except grpc.aio.AioRpcError as e:
+            code = e.code()
+            raise
+        finally:
+            _report(client_call_details.method, start, code)
+
+
+def insecure_channel(aio: bool = False, target: str | None = None, options: list = CHANNEL_OPTIONS):
+    """A (grpc.aio) channel to the datastore at DSHOST:DSPORT, or target."""
+    target = target or f"{DSHOST}:{DSPORT}"
+    if aio:
+        interceptors = [_AioTimingInterceptor()] if _call_hooks else None
+        return grpc.aio.insecure_channel(target, options=options, interceptors=interceptors)
+    channel = grpc.insecure_channel(target, options=options)
+    return grpc.intercept_channel(channel, _TimingInterceptor()) if _call_hooks else channel
+
+
+class ChannelPool:
+    """Pool of channels to the datastore, handed out round-robin.
+
+    An aio pool must be created and closed from within the event loop that uses it.
+    """
+
+    def __init__(self, size: int, aio: bool, target: str | None = None, options: list = CHANNEL_OPTIONS):
+        self.target = target or f"{DSHOST}:{DSPORT}"
+        self.aio = aio
+        self._channels = [insecure_channel(aio, self.target, options) for _ in range(max(size, 1))]
+        self._stubs = [dstore_grpc.DatastoreStub(channel) for channel in self._channels]
+        self._next = itertools.cycle(range(len(self._channels)))
+        self._lock = threading.Lock()
+        self._calls = [0] * len(self._channels)
+
+    def stub(self) -> dstore_grpc.DatastoreStub:
+        with self._lock:
+            index = next(self._next)
+            self._calls[index] += 1
+        return self._stubs[index]
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = list(self._calls)
+        return {
+            "channels": len(self._channels),
+            "calls": sum(calls),
+            "calls_per_channel": calls,
+            # Every call beyond the first on a channel reused an existing connection
+            "reused_calls": sum(max(c - 1, 0) for c in calls),
+        }
+
+    async def close(self):
+        for channel in self._channels:
+            if self.aio:
+                await channel.close()
+            else:
+                channel.close()
+
+
+def backoff_seconds(attempt: int) -> float:
+    # Exponential backoff with jitter, so the clients don't all retry at the same time
+    return min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2**attempt) * random.uniform(0.5, 1.0)
+
+
+def call_with_retries(method: Callable, request, retries: int = RETRIES, **kwargs):
+    """Call the stub method, retrying with backoff while the datastore is unavailable or overloaded."""
+    for attempt in itertools.count():
+        try:
+            return method(request, **kwargs)
+        except grpc.RpcError as e:
+            if e.code() not in RETRY_CODES or attempt >= retries:
+                raise
+            sleep(backoff_seconds(attempt))
+
+
+async def call_with_retries_async(method: Callable, request, retries: int = RETRIES, **kwargs):
+    """Like call_with_retries, for the methods of an aio stub."""
+    for attempt in itertools.count():
+        try:
+            return await method(request, **kwargs)
+        except grpc.aio.AioRpcError as e:
+            if e.code() not in RETRY_CODES or attempt >= retries:
+                raise
+            await asyncio.sleep(backoff_seconds(attempt))
@@ -0,0 +1,145 @@
+from collections import namedtuple
+from itertools import chain
+from operator import attrgetter
+from typing import Iterable
+from typing import Sequence
+
+import datastore_pb2 as dstore
+import numpy as np
+
+
+# The observations of a time series as columns. The positions are the distinct (lat, lon) of the
+# observations, and position_index has the index in positions of each observation
+SeriesArrays = namedtuple("SeriesArrays", ["ts_mdata", "times", "values", "positions", "position_index"])
+
+_UNITS_PER_SECOND = {"s": 1, "ms": 1_000, "us": 1_000_000, "ns": 1_000_000_000}
+_value = attrgetter("value")
+_lat = attrgetter("geo_point.lat")
+_lon = attrgetter("geo_point.lon")
+
+
+def decode_times(obs_mdata: Sequence[dstore.ObsMetadata], time_unit: str = "s") -> np.ndarray:
+    """The obstime_instants as datetime64 of the unit (s, ms, us or ns), rounded down to it, NaT if not set."""
+    units_per_second = _UNITS_PER_SECOND[time_unit]
+    nanos_per_unit = 1_000_000_000 // units_per_second
+    # Both fields of an obstime_instant in one pass, as getting it from a message is the expensive part
+    times = np.fromiter(
+        ((t := o.obstime_instant).seconds * units_per_second + t.nanos // nanos_per_unit for o in obs_mdata),
+        np.int64,
+        len(obs_mdata),
+    ).astype(f"datetime64[{time_unit}]")
+    # An obstime_instant that is not set reads as the epoch
+    for i in np.flatnonzero(times == np.datetime64(0, time_unit)).tolist():
+        if not obs_mdata[i].HasField("obstime_instant"):
+            times[i] = np.datetime64("NaT")
+    return times
+
+
+def _to_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def decode_values(obs_mdata: Sequence[dstore.ObsMetadata]) -> np.ndarray:
+    """The values as float64, NaN if they are not a number."""
+    values = list(map(_value, obs_mdata))
+    try:
+        return np.fromiter(map(float, values), np.float64, len(values))
+    except ValueError:
+        return np.fromiter(map(_to_float, values), np.float64, len(values))
+
+
+def _lat_lon(obs_mdata: Sequence[dstore.ObsMetadata]) -> tuple[np.ndarray, np.ndarray]:
+    count = len(obs_mdata)
+    return np.fromiter(map(_lat, obs_mdata), np.float64, count), np.fromiter(map(_lon, obs_mdata), np.float64, count)
+
+
+def decode_positions(obs_mdata: Sequence[dstore.ObsMetadata]) -> tuple[np.ndarray, np.ndarray]:
+    """The distinct positions of the geo_points and the index in them per observation, see SeriesArrays.
+
+    Observations with a geo_polygon are at (0, 0).
+    """
+    return _distinct_positions(*_lat_lon(obs_mdata))
+
+
+def decode_response(response: dstore.GetObsResponse | bytes, time_unit: str = "s") -> list[SeriesArrays]:
+    """The time series of a (serialized) GetObsResponse as NumPy arrays.
+
+    Each field is converted for all observations at once, see decode_times, decode_values and
+    decode_positions, rather than looping over the observations of each time series per field.
+    """
+    if not isinstance(response, dstore.GetObsResponse):
+        response = dstore.GetObsResponse.FromString(response)
+    series = response.observations
+    obs_mdata = list(chain.from_iterable(md.obs_mdata for md in series))
+    times = decode_times(obs_mdata, time_unit)
+    values = decode_values(obs_mdata)
+    lat, lon = _lat_lon(obs_mdata)
+    bounds = np.cumsum([len(md.obs_mdata) for md in series], dtype=np.int64).tolist()
+    return [
+        SeriesArrays(md.ts_mdata, times[a:b], values[a:b], *_distinct_positions(lat[a:b], lon[a:b]))
+        for md, a, b in zip(series, [0] + bounds, bounds)
+    ]
+
+
+def _distinct_positions(lat: np.ndarray, lon: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    if len(lat) == 0:
+        return np.empty((0, 2)), np.zeros(0, np.intp)
+    if (lat == lat[0]).all() and (lon == lon[0]).all():
+        # The usual case of a time series at a fixed position
+        return np.array([[lat[0], lon[0]]]), np.zeros(len(lat), np.intp)
+    positions, position_index = np.unique(np.stack([lat, lon], axis=1), axis=0, return_inverse=True)
+    return positions, position_index.ravel()
+
+
+def concat_series(parts: Iterable[list[SeriesArrays]]) -> list[SeriesArrays]:
+    """Join the parts of the time series in decoded responses, e.g. of the chunks of iter_chunks."""
+    series = {}
+    for part in parts:
+        for s in part:
+            series.setdefault(s.ts_mdata.SerializeToString(deterministic=True), []).append(s)
+    joined = []
+    for same in series.values():
+        if len(same) == 1:
+            joined.append(same[0])
+            continue
+        positions = np.concatenate([s.positions[s.position_index] for s in same])
+        joined.append(
+            SeriesArrays(
+                same[0].ts_mdata,
+                np.concatenate([s.times for s in same]),
+                np.concatenate([s.values for s in same]),
+                *_distinct_positions(positions[:, 0], positions[:, 1]),
+            )
+        )
+    return joined
+
+
+def to_table(response: dstore.GetObsResponse | bytes, ts_attrs: Sequence[str] = ("platform", "instrument", "unit")):
+    """The observations of a (serialized) GetObsResponse as an Arrow table, with a row per observation.
+
+    The table has the given time series attributes as dictionary encoded columns, and time (in
+    seconds), value, lat and lon columns. Needs pyarrow, which is not a requirement of the package.
+    """
+    import pyarrow as pa
+
+    series = decode_response(response)
+    counts = [len(s.times) for s in series]
+    series_index = np.repeat(np.arange(len(series)), counts)
+    columns = {}
+    for attr in ts_attrs:
+        dictionary, indices = np.unique(np.array([getattr(s.ts_mdata, attr) for s in series], str), return_inverse=True)
+        columns[attr] = pa.DictionaryArray.from_arrays(indices.astype(np.int32)[series_index], dictionary)
+    if series:
+        positions = np.concatenate([s.positions[s.position_index] for s in series])
+        columns["time"] = np.concatenate([s.times for s in series])
+        columns["value"] = np.concatenate([s.values for s in series])
+    else:
+        positions = np.empty((0, 2))
+        columns["time"] = np.empty(0, "datetime64[s]")
+        columns["value"] = np.empty(0)
+    columns["lat"] = positions[:, 0]
+    columns["lon"] = positions[:, 1]
+    return pa.table(columns)
@@ -0,0 +1,211 @@
+import asyncio
+import os
+from collections import deque
+from datetime import datetime
+from datetime import timedelta
+from itertools import islice
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+
+import datastore_pb2 as dstore
+
+
+# Don't split on time if that gives more windows than this, e.g. for open-ended intervals
+MAX_WINDOWS = 64
+# Target number of observations in a chunk of a request got in chunks
+CHUNK_ROWS = int(os.getenv("DSCHUNKROWS", "100000"))
+# Length of the first chunk, the next ones are sized by the number of observations in the previous one
+FIRST_CHUNK = timedelta(hours=1)
+MIN_CHUNK = timedelta(seconds=1)
+# A chunk is at most this many times as long as the previous one, e.g. after a gap in the data
+MAX_CHUNK_GROWTH = 4
+
+
+def split_interval(interval: dstore.TimeInterval, window: timedelta, max_windows: int = MAX_WINDOWS) -> list:
+    # An unset start or end leaves the interval open on that side
+    if not window or not interval.HasField("start") or not interval.HasField("end"):
+        return [interval]
+    start = interval.start.ToDatetime()
+    end = interval.end.ToDatetime()
+    if (end - start) / window > max_windows:
+        return [interval]
+    windows = []
+    while start < end:
+        part = dstore.TimeInterval()
+        part.start.FromDatetime(start)
+        start = min(start + window, end)
+        part.end.FromDatetime(start)
+        windows.append(part)
+    return windows
+
+
+def split_request(
+    get_obs_request: dstore.GetObsRequest, window: timedelta = timedelta(0), max_windows: int = MAX_WINDOWS
+) -> list:
+    """Split a GetObsRequest by instrument and time window, in time order per instrument."""
+    instruments = [[instrument] for instrument in dict.fromkeys(get_obs_request.instruments)] or [[]]
+    windows = (
+        split_interval(get_obs_request.interval, window, max_windows)
+        if get_obs_request.HasField("interval")
+        else [None]
+    )
+    requests = []
+    for instrument in instruments:
+        for part in windows:
+            request = dstore.GetObsRequest()
+            request.CopyFrom(get_obs_request)
+            del request.instruments[:]
+            request.instruments.extend(instrument)
+            if part is not None:
+                request.interval.CopyFrom(part)
+            requests.append(request)
+    return requests
+
+
+def merge_responses(responses: list) -> dstore.GetObsResponse:
+    """Merge the responses of split requests, joining the parts of time series split on time."""
+    if len(responses) == 1:
+        return responses[0]
+    merged = dstore.GetObsResponse()
+    series = {}
+    for response in responses:
+        for md in response.observations:
+            key = md.ts_mdata.SerializeToString(deterministic=True)
+            if key in series:
+                series[key].obs_mdata.extend(md.obs_mdata)
+            else:
+                series[key] = merged.observations.add()
+                series[key].CopyFrom(md)
+    return merged
+
+
+async def iter_observations(
+    get_observations: Callable[[dstore.GetObsRequest], Awaitable[dstore.GetObsResponse]],
+    requests: Iterable[dstore.GetObsRequest],
+    concurrency: int,
+) -> AsyncIterator[dstore.GetObsResponse]:
+    """Yield the responses to the requests in order, while getting up to concurrency of them at a time.
+
+    get_observations is e.g. the GetObservations method of an aio stub. The caller can process a
+    response while the next ones are on their way, and only the responses not yet yielded are kept.
+    """
+    requests = iter(requests)
+    pending = deque(asyncio.ensure_future(get_observations(request)) for request in islice(requests, concurrency))
+    try:
+        while pending:
+            response = await pending.popleft()
+            if (request := next(requests, None)) is not None:
+                pending.append(asyncio.ensure_future(get_observations(request)))
+            yield response
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _observation_count(response: dstore.GetObsResponse) -> int:
+    return sum(len(md.obs_mdata) for md in response.observations)
+
+
+def _bound(name: str, interval: dstore.TimeInterval | None) -> datetime | None:
+    return getattr(interval, name).ToDatetime() if interval is not None and interval.HasField(name) else None
+
+
+def _bounds(
+    interval: dstore.TimeInterval, extent: dstore.TimeInterval | None
+) -> tuple[datetime | None, datetime | None]:
+    """The bounds of the interval, narrowed to the extent, e.g. for open bounds given as datetime.min/max."""
+    start, end = _bound("start", interval), _bound("end", interval)
+    extent_start, extent_end = _bound("start", extent), _bound("end", extent)
+    if extent_start is not None and (start is None or start < extent_start):
+        start = extent_start
+    if extent_end is not None and (end is None or end > extent_end):
+        end = extent_end
+    return start, end
+
+
+class _Chunks:
+    """The requests for the time chunks of a GetObsRequest, each sized by the observations in the previous one."""
+
+    def __init__(self, request: dstore.GetObsRequest, extent: dstore.TimeInterval | None, rows: int, first: timedelta):
+        self.request = request
+        self.rows = rows
+        self.window = first
+        self.start, self.end = _bounds(request.interval, extent)
+        self.first = True
+
+    def next(self, observations: int | None = None) -> dstore.GetObsRequest | None:
+        """The request for the next chunk, or None after the last one."""
+        if not self.first and (self.start is None or self.end is None or self.start >= self.end):
+            return None
+        if observations is not None:
+            growth = self.rows / observations if observations else MAX_CHUNK_GROWTH
+            self.window = max(self.window * min(growth, MAX_CHUNK_GROWTH), MIN_CHUNK)
+        if self.start is not None and self.end is not None:
+            self.window = min(self.window, max(self.end - self.start, MIN_CHUNK))
+        request = dstore.GetObsRequest()
+        request.CopyFrom(self.request)
+        if self.start is None or self.end is None:
+            # Without the extent of an open-ended interval, get it in one go
+            self.first = False
+            return request
+        # The first and last chunk keep the start and end of the request, which may be open
+        if not self.first:
+            request.interval.start.FromDatetime(self.start)
+        self.start += self.window
+        if self.start < self.end:
+            request.interval.end.FromDatetime(self.start)
+        self.first = False
+        return request
+
+
+def iter_chunks(
+    get_observations,
+    request: dstore.GetObsRequest,
+    extent: dstore.TimeInterval | None = None,
+    rows: int = CHUNK_ROWS,
+    first_chunk: timedelta = FIRST_CHUNK,
+) -> Iterator[dstore.GetObsResponse]:
+    """Yield the responses to a GetObsRequest split in time chunks of about rows observations each.
+
+    get_observations is the GetObservations method of a (sync) stub. The next chunk is requested
+    before a response is yielded, so it is on its way while the caller processes the response. The
+    chunks are spread over the interval narrowed to extent, e.g. the temporal_extent of a
+    GetExtentsResponse, which also gives the missing bounds of an open-ended interval. Without it, an
+    open-ended request is got in one go. The first and last chunk keep the request's own start and
+    end. The parts of a time series in the chunks can be joined with merge_responses.
+    """
+    chunks = _Chunks(request, extent, rows, first_chunk)
+    pending = get_observations.future(chunks.next())
+    try:
+        while pending is not None:
+            response = pending.result()
+            next_request = chunks.next(_observation_count(response))
+            pending = get_observations.future(next_request) if next_request is not None else None
+            yield response
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+async def iter_chunks_async(
+    get_observations: Callable[[dstore.GetObsRequest], Awaitable[dstore.GetObsResponse]],
+    request: dstore.GetObsRequest,
+    extent: dstore.TimeInterval | None = None,
+    rows: int = CHUNK_ROWS,
+    first_chunk: timedelta = FIRST_CHUNK,
+) -> AsyncIterator[dstore.GetObsResponse]:
+    """Same as iter_chunks, with get_observations e.g. the GetObservations method of an aio stub."""
+    chunks = _Chunks(request, extent, rows, first_chunk)
+    pending = asyncio.ensure_future(get_observations(chunks.next()))
+    try:
+        while pending is not None:
+            response = await pending
+            next_request = chunks.next(_observation_count(response))
+            pending = asyncio.ensure_future(get_observations(next_request)) if next_request is not None else None
+            yield response
+    finally:
+        if pending is not None:
+            pending.cancel()
@@ -0,0 +1,27 @@
+from datetime import datetime
+from typing import Iterable
+
+import datastore_pb2 as dstore
+from google.protobuf.timestamp_pb2 import Timestamp
+
+
+def timestamp(dtime: datetime) -> Timestamp:
+    """The Timestamp of a datetime, which is taken to be in UTC if it is naive."""
+    tstamp = Timestamp()
+    tstamp.FromDatetime(dtime)
+    return tstamp
+
+
+def time_interval(start: datetime | None = None, end: datetime | None = None) -> dstore.TimeInterval:
+    """The interval [start, end), open-ended on the sides that are None."""
+    interval = dstore.TimeInterval()
+    if start is not None:
+        interval.start.FromDatetime(start)
+    if end is not None:
+        interval.end.FromDatetime(end)
+    return interval
+
+
+def polygon(points: Iterable[tuple[float, float]]) -> dstore.Polygon:
+    """The Polygon with the given (lat, lon) points. Note that shapely and WKT have (lon, lat) instead."""
+    return dstore.Polygon(points=[dstore.Point(lat=lat, lon=lon) for lat, lon in points])
@@ -0,0 +1,142 @@
+import asyncio
+from collections import deque
+from time import perf_counter
+from time import sleep
+from typing import Callable
+from typing import Iterable
+
+import grpc
+
+from .batching import Batch
+from .batching import Batcher
+from .batching import put_serialized
+from .channel import backoff_seconds
+from .channel import RETRIES
+from .channel import RETRY_CODES
+
+
+REPORT_SECONDS = 10.0
+
+
+class Progress:
+    """Count the inserted observations, and print the throughput every REPORT_SECONDS."""
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.calls = 0
+        self.observations = 0
+        self._reported_at = self.start
+        self._reported_observations = 0
+
+    def add(self, observations: int):
+        self.calls += 1
+        self.observations += observations
+        now = perf_counter()
+        if now - self._reported_at >= REPORT_SECONDS:
+            recent = (self.observations - self._reported_observations) / (now - self._reported_at)
+            print(f"Inserted {self.observations} observations, {recent:.0f} obs/s ({self.rate():.0f} obs/s overall).")
+            self._reported_at = now
+            self._reported_observations = self.observations
+
+    def rate(self) -> float:
+        return self.observations / max(perf_counter() - self.start, 1e-9)
+
+
+async def _put_batch(put_observations, batcher: Batcher, batch: Batch, progress: Progress) -> int:
+    for attempt in range(RETRIES + 1):
+        start = perf_counter()
+        try:
+            await put_observations(batch.data)
+        except grpc.aio.AioRpcError as e:
+            if e.code() not in RETRY_CODES or attempt == RETRIES:
+                raise
+            backoff = backoff_seconds(attempt)
+            print(f"PutObservations failed with {e.code().name}, retrying in {backoff:.1f}s.")
+            await asyncio.sleep(backoff)
+            continue
+        batcher.observe(len(batch.data), perf_counter() - start)
+        progress.add(batch.observations)
+        return batch.items
+
+
+def put_observations(channel: grpc.Channel, items: Iterable, progress: Progress | None = None) -> Progress:
+    """Insert the observations with one call at a time, retrying like send. For scripts without asyncio.
+
+    Items are as for Batcher.batches. The progress, if given, has the observations inserted so far
+    when a call fails.
+    """
+    batcher = Batcher()
+    put = put_serialized(channel)
+    progress = progress or Progress()
+    for batch in batcher.batches(items):
+        for attempt in range(RETRIES + 1):
+            start = perf_counter()
+            try:
+                put(batch.data)
+            except grpc.RpcError as e:
+                if e.code() not in RETRY_CODES or attempt == RETRIES:
+                    raise
+                sleep(backoff_seconds(attempt))
+                continue
+            batcher.observe(len(batch.data), perf_counter() - start)
+            progress.add(batch.observations)
+            break
+    return progress
+
+
+async def send(
+    observation_request_messages: Iterable,
+    channel: grpc.aio.Channel,
+    window: asyncio.Semaphore,
+    progress: Progress,
+    on_acknowledged: Callable[[int], None] | None = None,
+):
+    """Send the requests while they are being produced, with a call in flight per slot of the window.
+
+    The requests are repacked by a Batcher into requests that fit the datastore limits. The next
+    batch is built in a thread while the calls are in flight, and at most one batch is built but
+    not yet sent, which keeps memory use flat however many requests there are. Concurrent sends
+    can share the window, to limit the calls in flight in total. The first call that fails (after
+    retries) cancels the others and raises.
+
+    As calls complete out of order, on_acknowledged is called with the number of leading requests
+    that the datastore has stored completely, whenever that number increases.
+    """
+    loop = asyncio.get_running_loop()
+    batcher = Batcher()
+    batches = batcher.batches(observation_request_messages)
+    put_observations = put_serialized(channel)
+    in_order = deque()  # The calls not yet acknowledged in order, oldest first
+    running = set()
+    errors = []
+
+    def acknowledge():
+        items = None
+        while in_order and in_order[0].done() and not in_order[0].cancelled() and not in_order[0].exception():
+            items = in_order.popleft().result()
+        if items is not None and on_acknowledged is not None:
+            on_acknowledged(items)
+
+    def call_done(task: asyncio.Task):
+        running.discard(task)
+        window.release()
+        if not task.cancelled() and task.exception() is not None:
+            errors.append(task.exception())
+        acknowledge()
+
+    try:
+        while (batch := await loop.run_in_executor(None, next, batches, None)) is not None:
+            await window.acquire()
+            if errors:
+                window.release()
+                raise errors[0]
+            task = asyncio.create_task(_put_batch(put_observations, batcher, batch, progress))
+            task.add_done_callback(call_done)
+            in_order.append(task)
+            running.add(task)
+        await asyncio.gather(*running)
+        if errors:
+            raise errors[0]
+    finally:
+        for task in list(running):
+            task.cancel()
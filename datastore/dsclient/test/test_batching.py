@@ -0,0 +1,57 @@
+import datastore_pb2 as dstore
+import pytest
+from dsclient import Batcher
+from dsclient import to_series
+
+
+def create_observations(count, platforms=3, value_size=100):
+    return [
+        dstore.Metadata1(
+            ts_mdata=dstore.TSMetadata(platform=str(i % platforms)),
+            obs_mdata=dstore.ObsMetadata(id=str(i), value="x" * value_size),
+        )
+        for i in range(count)
+    ]
+
+
+def observation_ids(batches):
+    ids = []
+    for batch in batches:
+        request = dstore.PutObsRequest.FromString(batch.data)
+        ids.extend(observation.obs_mdata.id for observation in request.observations)
+        ids.extend(obs_mdata.id for series in request.series for obs_mdata in series.obs_mdata)
+    return ids
+
+
+def test_batches_keep_observations_in_order():
+    observations = create_observations(1000)
+    batcher = Batcher(max_bytes=10000, max_observations=70, target_seconds=0)
+
+    batches = list(batcher.batches(observations))
+
+    assert observation_ids(batches) == [str(i) for i in range(1000)]
+    assert all(len(batch.data) <= 10000 and batch.observations <= 70 for batch in batches)
+    assert batches[-1].items == 1000
+
+
+def test_split_request_completes_item_in_last_batch():
+    batcher = Batcher(max_bytes=10000, max_observations=70, target_seconds=0)
+
+    batches = list(batcher.batches([dstore.PutObsRequest(series=to_series(create_observations(1000)))]))
+
+    assert sorted(observation_ids(batches), key=int) == [str(i) for i in range(1000)]
+    assert [batch.items for batch in batches] == [0] * (len(batches) - 1) + [1]
+
+
+def test_to_series_groups_by_time_series():
+    series = to_series(create_observations(10))
+
+    assert [s.ts_mdata.platform for s in series] == ["0", "1", "2"]
+    assert [o.id for o in series[0].obs_mdata] == ["0", "3", "6", "9"]
+
+
+def test_observation_too_big():
+    batcher = Batcher(target_seconds=0)
+
+    with pytest.raises(ValueError):
+        list(batcher.batches(create_observations(1, value_size=5 * 1024 * 1024)))
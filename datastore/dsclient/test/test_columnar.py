@@ -0,0 +1,95 @@
+import datastore_pb2 as dstore
+import numpy as np
+import pytest
+from dsclient import decode_response
+from dsclient import to_table
+
+
+def create_response(series, observations):
+    response = dstore.GetObsResponse()
+    for i in range(series):
+        md = response.observations.add()
+        md.ts_mdata.platform = str(i)
+        md.ts_mdata.instrument = "x"
+        for j in range(observations):
+            obs = md.obs_mdata.add(id=f"{i}-{j}", value=f"{i * 0.5 - j:.2f}")
+            obs.geo_point.lat = 52.1
+            obs.geo_point.lon = 5.18 + (j % 3 if i % 2 else 0)  # Some moving platforms
+            obs.obstime_instant.seconds = 1672444800 + j * 600
+    return response
+
+
+def expected(response, time_unit):
+    for md in response.observations:
+        times = [o.obstime_instant.seconds * 1_000_000_000 + o.obstime_instant.nanos for o in md.obs_mdata]
+        values = []
+        for o in md.obs_mdata:
+            try:
+                values.append(float(o.value))
+            except ValueError:
+                values.append(np.nan)
+        positions = [(o.geo_point.lat, o.geo_point.lon) for o in md.obs_mdata]
+        not_set = [not o.HasField("obstime_instant") for o in md.obs_mdata]
+        times = np.array(times, dtype="datetime64[ns]").astype(f"datetime64[{time_unit}]")
+        times[not_set] = np.datetime64("NaT")
+        yield md.ts_mdata, times, np.array(values, dtype=np.float64), np.array(positions).reshape(-1, 2)
+
+
+def assert_decoded(response, time_unit="s"):
+    decoded = decode_response(response.SerializeToString(), time_unit)
+
+    assert len(decoded) == len(response.observations)
+    for series, (ts_mdata, times, values, positions) in zip(decoded, expected(response, time_unit)):
+        assert series.ts_mdata == ts_mdata
+        np.testing.assert_array_equal(series.times, times)
+        np.testing.assert_array_equal(series.values, values)
+        np.testing.assert_array_equal(series.positions[series.position_index], positions)
+
+
+@pytest.mark.parametrize("series,observations", [(1, 1), (3, 10), (100, 100), (1000, 3)])
+def test_decode_response(series, observations):
+    assert_decoded(create_response(series, observations))
+
+
+@pytest.mark.parametrize("time_unit", ["s", "ms", "us", "ns"])
+def test_decode_response_special_values(time_unit):
+    response = create_response(100, 100)
+    obs = response.observations[3].obs_mdata
+    obs[0].obstime_instant.nanos = 123456789
+    obs[1].obstime_instant.seconds = -86400  # Before 1970
+    obs[2].ClearField("obstime_instant")
+    obs[3].value = "not a number"
+    obs[4].value = ""
+    obs[5].value = "1e-3"
+    obs[6].geo_point.lat = 0
+    obs[7].ClearField("geo_point")
+    obs[8].geo_polygon.points.add(lat=1, lon=2)
+    obs[9].obstime_instant.nanos = 999
+    obs[10].obstime_instant.seconds = 0
+    response.observations.add().ts_mdata.platform = "without observations"
+
+    assert_decoded(response, time_unit)
+
+
+def test_decode_empty_response():
+    assert decode_response(dstore.GetObsResponse()) == []
+
+
+def test_to_table():
+    pytest.importorskip("pyarrow")
+    response = create_response(3, 10)
+    response.observations[1].ts_mdata.instrument = "y"
+
+    table = to_table(response)
+
+    assert table.num_rows == 30
+    assert table.column("platform").to_pylist() == [str(i) for i in range(3) for _ in range(10)]
+    assert table.column("instrument").to_pylist() == ["x"] * 10 + ["y"] * 10 + ["x"] * 10
+    times = np.concatenate([times for _, times, _, _ in expected(response, "s")])
+    np.testing.assert_array_equal(table.column("time").to_numpy(), times)
+    np.testing.assert_array_equal(
+        table.column("value").to_numpy(), [float(o.value) for md in response.observations for o in md.obs_mdata]
+    )
+    np.testing.assert_array_equal(
+        table.column("lon").to_numpy(), [o.geo_point.lon for md in response.observations for o in md.obs_mdata]
+    )
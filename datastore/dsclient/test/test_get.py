@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime
+
+import datastore_pb2 as dstore
+from dsclient import iter_chunks
+from dsclient import iter_observations
+from dsclient import time_interval
+
+
+def test_iter_observations_in_order_with_bounded_concurrency():
+    in_flight, max_in_flight = 0, 0
+
+    async def get_observations(request):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        # Later requests complete first
+        await asyncio.sleep(0.01 * (10 - len(request.platforms[0])))
+        in_flight -= 1
+        response = dstore.GetObsResponse()
+        response.observations.add().ts_mdata.platform = request.platforms[0]
+        return response
+
+    async def get_all():
+        requests = [dstore.GetObsRequest(platforms=["x" * (i + 1)]) for i in range(8)]
+        return [response async for response in iter_observations(get_observations, requests, 3)]
+
+    responses = asyncio.run(get_all())
+
+    assert [len(response.observations[0].ts_mdata.platform) for response in responses] == list(range(1, 9))
+    assert max_in_flight == 3
+
+
+class FakeFuture:
+    def __init__(self, result):
+        self._result = result
+
+    def result(self):
+        return self._result
+
+    def cancel(self):
+        pass
+
+
+class FakeGetObservations:
+    """GetObservations of a datastore with an observation every minute of 2023-01-01."""
+
+    def __init__(self):
+        self.requests = []
+
+    def future(self, request):
+        self.requests.append(request)
+        start = request.interval.start.seconds if request.interval.HasField("start") else 0
+        end = request.interval.end.seconds if request.interval.HasField("end") else 2**40
+        response = dstore.GetObsResponse()
+        md = response.observations.add()
+        for seconds in range(max(start, 1672531200), min(end, 1672531200 + 24 * 3600), 60):
+            md.obs_mdata.add().obstime_instant.seconds = seconds
+        return FakeFuture(response)
+
+
+def test_iter_chunks_sized_by_observations():
+    get_observations = FakeGetObservations()
+    extent = time_interval(datetime(2023, 1, 1), datetime(2023, 1, 1, 23, 59))
+    request = dstore.GetObsRequest(instruments=["rh"])
+
+    chunks = iter_chunks(get_observations, request, extent, rows=200)
+    first = next(chunks)
+    # The next chunk is requested before the first one is processed
+    assert len(get_observations.requests) == 2
+    responses = [first, *chunks]
+
+    counts = [len(response.observations[0].obs_mdata) for response in responses]
+    assert sum(counts) == 24 * 60
+    assert counts[0] == 60 and all(count == 200 for count in counts[1:-1])
+    requests = get_observations.requests
+    # Open-ended like the request at the start and end, and without gaps in between
+    assert not requests[0].interval.HasField("start") and not requests[-1].interval.HasField("end")
+    assert all(a.interval.end == b.interval.start for a, b in zip(requests, requests[1:]))
+    assert all(list(r.instruments) == ["rh"] for r in requests)
+
+
+def test_iter_chunks_without_extent_gets_open_ended_request_at_once():
+    get_observations = FakeGetObservations()
+
+    responses = list(iter_chunks(get_observations, dstore.GetObsRequest(), rows=200))
+
+    assert len(responses) == 1 and len(responses[0].observations[0].obs_mdata) == 24 * 60
+
+
+def test_iter_chunks_narrows_interval_to_extent():
+    get_observations = FakeGetObservations()
+    extent = time_interval(datetime(2023, 1, 1), datetime(2023, 1, 1, 23, 59))
+    # E.g. the API gives ".." as datetime.min and datetime.max
+    request = dstore.GetObsRequest(interval=time_interval(datetime.min, datetime.max))
+
+    responses = list(iter_chunks(get_observations, request, extent, rows=200))
+
+    counts = [len(response.observations[0].obs_mdata) for response in responses]
+    assert sum(counts) == 24 * 60
+    assert counts[0] == 60 and all(count == 200 for count in counts[1:-1])
+    requests = get_observations.requests
+    assert requests[0].interval.start == request.interval.start and requests[-1].interval.end == request.interval.end
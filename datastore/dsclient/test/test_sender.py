@@ -0,0 +1,48 @@
+import asyncio
+
+import datastore_pb2 as dstore
+import grpc
+import pytest
+from dsclient import Batch
+from dsclient import Progress
+from dsclient import send
+from test_batching import create_observations
+from test_batching import observation_ids
+
+
+class FakeChannel:
+    """PutObservations that fails, without retries, for the request with the observation fail_id."""
+
+    def __init__(self, fail_id):
+        self.fail_id = fail_id
+        self.stored = []
+
+    def unary_unary(self, method, response_deserializer=None):
+        async def put_observations(data):
+            ids = observation_ids([Batch(data, 0, 0)])
+            if self.fail_id in ids:
+                raise grpc.aio.AioRpcError(
+                    grpc.StatusCode.INVALID_ARGUMENT, grpc.aio.Metadata(), grpc.aio.Metadata(), "invalid"
+                )
+            await asyncio.sleep(0.01)
+            self.stored.extend(ids)
+            return dstore.PutObsResponse()
+
+        return put_observations
+
+
+@pytest.mark.parametrize("fail_id", ["0", "29"])
+def test_send_raises_failed_call(fail_id):
+    observations = create_observations(30, value_size=300_000)  # Several batches
+    channel = FakeChannel(fail_id)
+    acknowledged = []
+
+    async def main():
+        await send(observations, channel, asyncio.Semaphore(4), Progress(), acknowledged.append)
+
+    with pytest.raises(grpc.aio.AioRpcError) as e:
+        asyncio.run(main())
+
+    assert e.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+    assert fail_id not in channel.stored
+    assert not acknowledged or acknowledged[-1] < 30
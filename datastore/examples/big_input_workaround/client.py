@@ -1,8 +1,8 @@
 """This client demonstrates how to work around gRPC message size limit by
    calling PutObservations multiple times.
-   The overall set of observations is gradually split into smaller and
-   smaller parts until each one is successfully accommodated in a single
-   request message to PutObservations.
+   The overall set of observations is packed into requests by their
+   serialized size by the client package (dsclient), so that each request
+   fits in a single request message to PutObservations.
 
    Tested with Python 3.11
 
@@ -12,26 +12,26 @@
      python -m grpc_tools.protoc --proto_path=protobuf datastore.proto \
          --python_out=../examples/big_input_workaround \
          --grpc_python_out=../examples/big_input_workaround
+
+   The client package is in the directory that contains the 'examples'
+   subdirectory, so run the client from this directory with:
+
+     PYTHONPATH=../.. python client.py
 """
 import argparse
-import os
 import sys
-from collections import deque
 from datetime import datetime
 from datetime import timezone
 
 import datastore_pb2 as dstore
-import datastore_pb2_grpc as dstore_grpc
 import grpc
+from dsclient import insecure_channel
+from dsclient import Progress
+from dsclient import put_observations
+from dsclient import timestamp
 from google.protobuf.timestamp_pb2 import Timestamp
 
 
-def dtime2tstamp(dtime):
-    tstamp = Timestamp()
-    tstamp.FromDatetime(dtime)
-    return tstamp
-
-
 # create_observations creates a set of observations.
 def create_observations(obs_count, summary_size):
     # create time series metadata common to all observations
@@ -44,7 +44,7 @@ def create_observations(obs_count, summary_size):
         # more attributes ...
     )
 
-    pubtime = dtime2tstamp(datetime(2023, 1, 1, 0, 0, 10, 0, tzinfo=timezone.utc))
+    pubtime = timestamp(datetime(2023, 1, 1, 0, 0, 10, 0, tzinfo=timezone.utc))
 
     obs = []
 
@@ -80,52 +80,27 @@ def create_observations(obs_count, summary_size):
 #   - total number of observations to be inserted,
 #   - number of observations successfully inserted,
 #   - total calls to PutObservations.
-def call_put_obs(stub, obs_count, summary_size):
+def call_put_obs(channel, obs_count, summary_size):
     # create overall set of observations to be inserted in the store
     obs = create_observations(obs_count, summary_size)
 
-    stack = deque()
-
-    if len(obs) > 0:
-        stack.append(obs)  # push overall set on stack
-
-    tot_inserted = 0  # total observations succesfully inserted
-    tot_calls = 0  # total calls to PutObservations
-
-    while len(stack) > 0:  # while more (sub)sets remain
-        # try to insert next (sub)set in the store
-        obs0 = stack.pop()
-        request = dstore.PutObsRequest(observations=obs0)
-
-        try:
-            stub.PutObservations(request)
-            tot_inserted += len(obs0)
-            tot_calls += 1
-        except grpc.RpcError as err:
-            if err.code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
-                if len(obs0) == 1:  # give up, since even a single observation
-                    # (that may not be split further!) is too big for a single message
-                    print("error: even a single obs is too big for a single message")
-                    break
-
-                # split obs0 into two subsets, push both on stack,
-                # and try again
-                m = len(obs0) // 2
-                obs1, obs2 = obs0[:m], obs0[m:]
-                if len(obs1) > 0:
-                    stack.append(obs1)
-                if len(obs2) > 0:
-                    stack.append(obs2)
-                continue
-
-            # give up
-            print(f"unexpected error (code: {err.code()}; details: {err.details()})")
-            break
+    # counts the observations succesfully inserted and the calls to PutObservations
+    progress = Progress()
+
+    try:
+        # calls PutObservations with serialized requests that are each below the message size limit
+        put_observations(channel, obs, progress)
+    except ValueError:  # give up, since even a single observation
+        # (that may not be split further!) is too big for a single message
+        print("error: even a single obs is too big for a single message")
+    except grpc.RpcError as err:
+        # give up
+        print(f"unexpected error (code: {err.code()}; details: {err.details()})")
 
     # NOTE: at this point, the overall set of observations has been completely
-    # inserted in the store only if no errors occurred in the above loop
+    # inserted in the store only if no errors occurred above
 
-    return len(obs), tot_inserted, tot_calls
+    return len(obs), progress.observations, progress.calls
 
 
 def parse_args():
@@ -153,12 +128,10 @@ def parse_args():
 
 
 if __name__ == "__main__":
-    with grpc.insecure_channel(f"{os.getenv('DSHOST', 'localhost')}:{os.getenv('DSPORT', '50050')}") as channel:
-        stub = dstore_grpc.DatastoreStub(channel)
-
+    with insecure_channel() as channel:
         obs_count, summary_size = parse_args()
 
-        tot_obs, tot_ins, tot_calls = call_put_obs(stub, obs_count, summary_size)
+        tot_obs, tot_ins, tot_calls = call_put_obs(channel, obs_count, summary_size)
 
         ps = f"{(tot_ins / tot_obs) * 100:.2f}" if tot_obs > 0 else "0.0"
 
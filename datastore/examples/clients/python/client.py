@@ -2,20 +2,17 @@
 # tested with Python 3.11
 # Generate protobuf code with following command from top level directory:
 # python -m grpc_tools.protoc --proto_path=datastore/protobuf datastore.proto --python_out=examples/clients/python --grpc_python_out=examples/clients/python  # noqa: E501
-import os
+# The client package (dsclient) is in the top level directory, so run the client from this directory with:
+# PYTHONPATH=../../.. python client.py
 from datetime import datetime
 from datetime import timezone
 
 import datastore_pb2 as dstore
 import datastore_pb2_grpc as dstore_grpc
-import grpc
-from google.protobuf.timestamp_pb2 import Timestamp
-
-
-def dtime2tstamp(dtime):
-    tstamp = Timestamp()
-    tstamp.FromDatetime(dtime)
-    return tstamp
+from dsclient import insecure_channel
+from dsclient import polygon
+from dsclient import time_interval
+from dsclient import timestamp
 
 
 # callPutObs demonstrates how to insert observations in the datastore.
@@ -34,9 +31,9 @@ def call_put_obs(stub, version, type, standard_name, unit, value):
             lat=59.91,
             lon=10.75,
         ),
-        pubtime=dtime2tstamp(datetime(2023, 1, 1, 0, 0, 10, 0, tzinfo=timezone.utc)),
+        pubtime=timestamp(datetime(2023, 1, 1, 0, 0, 10, 0, tzinfo=timezone.utc)),
         data_id="data_id_dummy",
-        obstime_instant=dtime2tstamp(datetime(2023, 1, 1, 0, 0, 0, 0, tzinfo=timezone.utc)),
+        obstime_instant=timestamp(datetime(2023, 1, 1, 0, 0, 0, 0, tzinfo=timezone.utc)),
         value=value,
         # add more attributes as required ...
     )
@@ -58,9 +55,9 @@ def call_put_obs(stub, version, type, standard_name, unit, value):
 # obs time range.
 def call_get_obs_in_time_range(stub):
     request = dstore.GetObsRequest(
-        interval=dstore.TimeInterval(
-            start=dtime2tstamp(datetime(2023, 1, 1, 0, 0, 0, 0, tzinfo=timezone.utc)),
-            end=dtime2tstamp(datetime(2023, 1, 2, 0, 0, 0, 0, tzinfo=timezone.utc)),
+        interval=time_interval(
+            start=datetime(2023, 1, 1, 0, 0, 0, 0, tzinfo=timezone.utc),
+            end=datetime(2023, 1, 2, 0, 0, 0, 0, tzinfo=timezone.utc),
         )
     )
     response = stub.GetObservations(request)
@@ -71,20 +68,16 @@ def call_get_obs_in_time_range(stub):
 # callGetObsInPolygon demonstrates how to retrieve from the datastore all observations in a
 # polygon.
 def call_get_obs_in_polygon(stub):
-    points = []
-    points.append(dstore.Point(lat=59.90, lon=10.70))
-    points.append(dstore.Point(lat=59.90, lon=10.80))
-    points.append(dstore.Point(lat=60, lon=10.80))
-    points.append(dstore.Point(lat=60, lon=10.70))
+    points = [(59.90, 10.70), (59.90, 10.80), (60, 10.80), (60, 10.70)]  # (lat, lon)
 
-    request = dstore.GetObsRequest(inside=dstore.Polygon(points=points))
+    request = dstore.GetObsRequest(inside=polygon(points))
     response = stub.GetObservations(request)
 
     return response
 
 
 if __name__ == "__main__":
-    with grpc.insecure_channel(f"{os.getenv('DSHOST', 'localhost')}:{os.getenv('DSPORT', '50050')}") as channel:
+    with insecure_channel() as channel:
         stub = dstore_grpc.DatastoreStub(channel)
 
         version = "version_dummy"
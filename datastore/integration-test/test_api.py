@@ -1,6 +1,7 @@
 import json
 import logging
 import os
+import time
 from pathlib import Path
 
 import requests
@@ -12,6 +13,9 @@ logger.setLevel(os.environ.get("LOG_LEVEL", logging.INFO))
 
 
 BASE_URL = os.environ.get("BASE_URL", "http://localhost:8008")
+# The API refreshes the collection metadata and station positions from the datastore every minute
+# (METADATAREFRESH), so right after loading the test data it can take up to that long before they include it
+REFRESH_TIMEOUT = 90
 
 
 def actual_response_is_expected_response(actual_response, expected_path, **kwargs):
@@ -23,22 +27,39 @@ def actual_response_is_expected_response(actual_response, expected_path, **kwarg
     assert diff == {}
 
 
-def test_get_all_collections():
-    actual_response = requests.get(url=BASE_URL + "/collections")
+def eventually_expected_response(url, expected_path, **kwargs):
+    file_path = Path(Path(__file__).parent, expected_path).resolve()
+    with open(file_path) as file:
+        expected_json = json.load(file)
+
+    deadline = time.monotonic() + REFRESH_TIMEOUT
+    while True:
+        actual_response = requests.get(url=url)
+        diff = DeepDiff(expected_json, actual_response.json(), **kwargs)
+        if (actual_response.status_code == 200 and diff == {}) or time.monotonic() > deadline:
+            break
+        time.sleep(5)
 
     assert actual_response.status_code == 200
-    actual_response_is_expected_response(
-        actual_response, "response/capabilities/200/all_collections.json", exclude_regex_paths=r"\['href'\]$"
+    assert diff == {}
+
+
+def test_get_all_collections():
+    eventually_expected_response(
+        BASE_URL + "/collections",
+        "response/capabilities/200/all_collections.json",
+        exclude_regex_paths=r"\['href'\]$",
+        math_epsilon=1e-4,  # The bounding box can be slightly off, as PostGIS computes extents in single precision
     )
 
 
 def test_get_a_single_existing_collection():
     collection_id = "observations"
-    actual_response = requests.get(url=BASE_URL + f"/collections/{collection_id}")
-
-    assert actual_response.status_code == 200
-    actual_response_is_expected_response(
-        actual_response, "response/metadata/200/single_collection.json", exclude_regex_paths=r"\['href'\]$"
+    eventually_expected_response(
+        BASE_URL + f"/collections/{collection_id}",
+        "response/metadata/200/single_collection.json",
+        exclude_regex_paths=r"\['href'\]$",
+        math_epsilon=1e-4,
     )
 
 
@@ -53,11 +74,9 @@ def test_get_a_collection_which_does_not_exist():
 def test_from_a_single_collection_get_locations_within_a_bbox():
     collection_id = "observations"
     bbox = "5.0,52.0,6.0,52.1"
-    actual_response = requests.get(url=BASE_URL + f"/collections/{collection_id}/locations?bbox={bbox}")
-
-    assert actual_response.status_code == 200
-    actual_response_is_expected_response(
-        actual_response, "response/collection/locations/200/locations_within_a_bbox.json"
+    eventually_expected_response(
+        BASE_URL + f"/collections/{collection_id}/locations?bbox={bbox}",
+        "response/collection/locations/200/locations_within_a_bbox.json",
     )
 
 
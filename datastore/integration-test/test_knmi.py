@@ -1,12 +1,14 @@
 # Note that this assumes that the KNMI test data is loader (using loader container)
-import os
 from datetime import datetime
 
 import datastore_pb2 as dstore
 import datastore_pb2_grpc as dstore_grpc
-import grpc
 import pytest
-from google.protobuf.timestamp_pb2 import Timestamp
+from dsclient import insecure_channel
+from dsclient import iter_chunks
+from dsclient import merge_responses
+from dsclient import polygon
+from dsclient import time_interval
 
 
 NUMBER_OF_PARAMETERS = 44
@@ -15,7 +17,7 @@ NUMBER_OF_STATIONS = 55
 
 @pytest.fixture(scope="session")
 def grpc_stub():
-    with grpc.insecure_channel(f"{os.getenv('DSHOST', 'localhost')}:{os.getenv('DSPORT', '50050')}") as channel:
+    with insecure_channel() as channel:
         yield dstore_grpc.DatastoreStub(channel)
 
 
@@ -36,6 +38,18 @@ def test_find_series_all_stations_single_parameter(grpc_stub):
     assert len(response.observations) == 46  # Not all station have RH
 
 
+def test_get_all_stations_single_parameter_in_chunks(grpc_stub):
+    request = dstore.GetObsRequest(instruments=["rh"])
+    extent = grpc_stub.GetExtents(dstore.GetExtentsRequest()).temporal_extent
+
+    responses = list(iter_chunks(grpc_stub.GetObservations, request, extent, rows=2000))
+
+    assert len(responses) > 1
+    chunked = {md.ts_mdata.platform: len(md.obs_mdata) for md in merge_responses(responses).observations}
+    response = grpc_stub.GetObservations(request)
+    assert chunked == {md.ts_mdata.platform: len(md.obs_mdata) for md in response.observations}
+
+
 def test_find_series_single_station_all_parameters(grpc_stub):
     request = dstore.GetObsRequest(platforms=["06260"])
     response = grpc_stub.GetObservations(request)
@@ -55,12 +69,10 @@ def test_get_values_single_station_single_parameter(grpc_stub):
 
 
 def test_get_values_single_station_single_parameter_one_hour(grpc_stub):
-    start_datetime, end_datetime = Timestamp(), Timestamp()
-    start_datetime.FromDatetime(datetime(2022, 12, 31, 11))
-    end_datetime.FromDatetime(datetime(2022, 12, 31, 12))
-
     ts_request = dstore.GetObsRequest(
-        platforms=["06260"], instruments=["rh"], interval=dstore.TimeInterval(start=start_datetime, end=end_datetime)
+        platforms=["06260"],
+        instruments=["rh"],
+        interval=time_interval(datetime(2022, 12, 31, 11), datetime(2022, 12, 31, 12)),
     )
     response = grpc_stub.GetObservations(ts_request)
 
@@ -147,8 +159,7 @@ input_params_polygon = [
 
 @pytest.mark.parametrize("coords,param_ids,expected_station_ids", input_params_polygon)
 def test_get_observations_with_polygon(grpc_stub, coords, param_ids, expected_station_ids):
-    polygon = dstore.Polygon(points=[dstore.Point(lat=lat, lon=lon) for lat, lon in coords])
-    get_obs_request = dstore.GetObsRequest(inside=polygon, instruments=param_ids)
+    get_obs_request = dstore.GetObsRequest(inside=polygon(coords), instruments=param_ids)
     get_obs_response = grpc_stub.GetObservations(get_obs_request)
 
     actual_station_ids = sorted({ts.ts_mdata.platform for ts in get_obs_response.observations})
@@ -1,7 +1,10 @@
+import math
 import os
 import random
 import subprocess
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 
 def select_weighted_value(x):
@@ -42,6 +45,46 @@ def elapsed_secs(start_secs):
     return now_secs() - start_secs
 
 
+def exec_concurrently(workers, ops):
+    """Execute operations concurrently, with one thread per worker.
+
+    - workers is a list of objects (typically storage backends with separate database connections),
+      each passed to the operations executed by its thread
+    - ops is a list of functions that take a worker as the only argument; each operation is executed
+      once, by the next available thread
+
+    Returns the total elapsed secs and a list of the elapsed secs of each operation.
+    """
+
+    ops = iter(ops)
+    lock = threading.Lock()
+    op_secs = []
+
+    def run(worker):
+        while True:
+            with lock:
+                op = next(ops, None)
+            if op is None:
+                return
+            start_secs = now_secs()
+            op(worker)
+            secs = elapsed_secs(start_secs)
+            with lock:
+                op_secs.append(secs)
+
+    start_secs = now_secs()
+    with ThreadPoolExecutor(len(workers)) as executor:
+        for future in [executor.submit(run, worker) for worker in workers]:
+            future.result()  # raise any exception from the thread
+    return elapsed_secs(start_secs), op_secs
+
+
+def percentile(values, p):
+    """Return the p'th percentile (nearest rank) of a non-empty list of values."""
+    values = sorted(values)
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
 def get_env_var(name, default_value="", fail_on_empty=True):
     """Get environment variable."""
     v = os.getenv(name, default_value)
@@ -1,5 +1,7 @@
+import copy
 import shutil
 import sys
+import threading
 from pathlib import Path
 
 from netcdf import NetCDF
@@ -36,6 +38,22 @@ class NetCDFSBE_TSMDataInPostGIS(StorageBackend):  # noqa: N801
         self._nc_dir = nc_dir  # directory under which to keep the netCDF files
         self._netcdf = NetCDF(verbose)
         self._nc_fname = "data.nc"
+        # the netCDF/HDF5 libraries are not thread-safe, so the workers access the files one at a time
+        self._nc_lock = threading.Lock()
+
+    def worker(self):
+        """See documentation in base class."""
+
+        # the netCDF files are opened per operation, so only the PostGIS part needs a new connection
+        # (the copy shares the file lock)
+        sbe = copy.copy(self)
+        sbe._pgsbe = self._pgsbe.worker()
+        return sbe
+
+    def close(self):
+        """See documentation in base class."""
+
+        self._pgsbe.close()
 
     def reset(self, tss):
         """See documentation in base class."""
@@ -64,13 +82,15 @@ class NetCDFSBE_TSMDataInPostGIS(StorageBackend):  # noqa: N801
         """See documentation in base class."""
 
         path = "{}/{}/{}/{}".format(self._nc_dir, ts.station_id(), ts.param_id(), self._nc_fname)
-        self._netcdf.replace_times_and_values(path, times, values)
+        with self._nc_lock:
+            self._netcdf.replace_times_and_values(path, times, values)
 
     def add_obs(self, ts, times, values, oldest_time=None):
         """See documentation in base class."""
 
         path = "{}/{}/{}/{}".format(self._nc_dir, ts.station_id(), ts.param_id(), self._nc_fname)
-        self._netcdf.add_times_and_values(path, times, values, oldest_time)
+        with self._nc_lock:
+            self._netcdf.add_times_and_values(path, times, values, oldest_time)
 
     def get_obs(self, ts_ids, from_time, to_time):
         """See documentation in base class."""
@@ -85,8 +105,9 @@ class NetCDFSBE_TSMDataInPostGIS(StorageBackend):  # noqa: N801
         for ts_id in ts_ids:
             station_id, param_id = self._pgsbe.get_station_and_param(ts_id)
             path = "{}/{}/{}/{}".format(self._nc_dir, station_id, param_id, self._nc_fname)
-            times, values = self._netcdf.get_times_and_values(path, from_time, to_time)
-            res.append((ts_id, times[:], values[:]))
+            with self._nc_lock:
+                times, values = self._netcdf.get_times_and_values(path, from_time, to_time)
+                res.append((ts_id, times[:], values[:]))
 
         return res
 
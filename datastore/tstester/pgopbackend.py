@@ -30,6 +30,10 @@ class PGOpBackend(ABC):
     def commit(self):
         """Commits last operation."""
 
+    @abstractmethod
+    def close(self):
+        """Close any connection to the database server."""
+
 
 class Psycopg2BE(PGOpBackend):
     """A Postgres backend that uses the psycopg2 adapter."""
@@ -85,6 +89,12 @@ class Psycopg2BE(PGOpBackend):
 
         self._conn.commit()
 
+    def close(self):
+        """See documentation in base class."""
+
+        self._cur.close()
+        self._conn.close()
+
 
 class PsqlBE(PGOpBackend):
     """A backend that uses the psql command."""
@@ -123,3 +133,16 @@ class PsqlBE(PGOpBackend):
         """See documentation in base class."""
 
         # no-op, since n/a
+
+    def close(self):
+        """See documentation in base class."""
+
+        # no-op, since each operation runs its own psql command
+
+
+def create_pgopbe(verbose, conn_info):
+    """Create a database operation executor backend of the type selected by PGOPBACKEND."""
+
+    if common.get_env_var("PGOPBACKEND", "psycopg2") == "psycopg2":
+        return Psycopg2BE(verbose, conn_info)
+    return PsqlBE(verbose, conn_info)
@@ -13,6 +13,18 @@ class StorageBackend(ABC):
         """Return description of storage backend."""
         return self._descr
 
+    @abstractmethod
+    def worker(self):
+        """Return a storage backend for a worker thread.
+
+        The returned backend uses the same storage, but its own database connection(s), so that
+        several workers may execute operations on the storage concurrently.
+        """
+
+    @abstractmethod
+    def close(self):
+        """Close the database connection(s) of a storage backend returned by worker()."""
+
     @abstractmethod
     def reset(self, tss):
         """Replace any existing time series with tss.
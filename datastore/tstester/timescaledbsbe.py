@@ -1,9 +1,9 @@
+import copy
 import json
 import sys
 
 import common
-from pgopbackend import PsqlBE
-from pgopbackend import Psycopg2BE
+from pgopbackend import create_pgopbe
 from storagebackend import StorageBackend
 
 # NOTE: we assume that the risk of SQL injection is zero in this context
@@ -23,10 +23,7 @@ class TimescaleDBSBE(StorageBackend):
         self.__create_database()
 
         # create a database operation executor backend
-        if common.get_env_var("PGOPBACKEND", "psycopg2") == "psycopg2":
-            self._pgopbe = Psycopg2BE(verbose, self._conn_info)
-        else:
-            self._pgopbe = PsqlBE(verbose, self._conn_info)
+        self._pgopbe = create_pgopbe(verbose, self._conn_info)
 
         # install the postgis extension
         self.__install_postgis_extension()
@@ -43,6 +40,18 @@ class TimescaleDBSBE(StorageBackend):
             "dbname": self._conn_info.dbname(),
         }
 
+    def worker(self):
+        """See documentation in base class."""
+
+        sbe = copy.copy(self)  # i.e. without recreating the database like __init__() does
+        sbe._pgopbe = create_pgopbe(self._verbose, self._conn_info)
+        return sbe
+
+    def close(self):
+        """See documentation in base class."""
+
+        self._pgopbe.close()
+
     def __drop_database(self):
         """Drop any existing database named self._conn_info.dbname()."""
 
@@ -20,6 +20,7 @@ class TestBase(ABC):
         self._config = config
         self._storage_backends = storage_backends
         self._stats = {sbe.descr(): {} for sbe in storage_backends}
+        self._concurrency = config.get("concurrency", [1])  # numbers of workers to execute with
 
     @abstractmethod
     def descr(self):
@@ -38,6 +39,33 @@ class TestBase(ABC):
         """Register stats (typically elapsed secs for an operation) for a storage backend."""
         self._stats[sbe.descr()][stats_key] = stats_val
 
+    def _exec_concurrently(self, sbe, ops, nworkers, stats_key="", per_worker=False):
+        """Execute operations on a storage backend with nworkers workers.
+
+        - ops is a list of functions that take a storage backend as the only argument
+        - if per_worker is True, each worker executes all of ops (e.g. to measure concurrent queries),
+          otherwise the workers share them
+
+        Each worker has its own database connection(s), which are closed afterwards. Throughput and
+        latency stats are registered for the number of workers.
+        """
+        workers = [sbe] + [sbe.worker() for _ in range(nworkers - 1)]  # connect before timing
+        try:
+            total_secs, op_secs = common.exec_concurrently(workers, ops * nworkers if per_worker else ops)
+        finally:
+            for worker in workers[1:]:
+                worker.close()
+        stats = {"total secs": total_secs, "ops": len(op_secs)}
+        if op_secs:
+            stats["ops per sec"] = len(op_secs) / total_secs
+            stats["latency secs"] = {
+                "p50": common.percentile(op_secs, 50),
+                "p90": common.percentile(op_secs, 90),
+                "p99": common.percentile(op_secs, 99),
+                "max": max(op_secs),
+            }
+        self._reg_stats(sbe, "{}workers = {}".format(stats_key, nworkers), stats)
+
 
 class Reset(TestBase):
     def __init__(self, verbose, config, storage_backends, tss):
@@ -73,11 +101,12 @@ class FillStorage(TestBase):
             ts_data.append((ts, times, values))
 
         # store the time series in each backend
+        ops = [lambda sbe, td=td: sbe.set_obs(td[0], td[1], td[2]) for td in ts_data]
         for sbe in self._storage_backends:
-            start_secs = common.now_secs()
-            for td in ts_data:
-                sbe.set_obs(td[0], td[1], td[2])
-            self._reg_stats(sbe, "total secs", common.elapsed_secs(start_secs))
+            for i, nworkers in enumerate(self._concurrency):
+                if i > 0:
+                    sbe.reset(self._tss)  # start from empty time series like the first run (untimed)
+                self._exec_concurrently(sbe, ops, nworkers)
 
 
 class AddNewObs(TestBase):
@@ -92,27 +121,23 @@ class AddNewObs(TestBase):
     def _execute(self):
         curr_time = self._curr_time
         for extra_secs in self._config["extra_secs"]:
-            # add new observations to each time series in interval
-            # [curr_time, curr_time + extra_secs])
-            ts_data = []
-            from_time, to_time = curr_time, curr_time + extra_secs
-            oldest_time = to_time - self._config["max_age"]  # remove oldest observations
-            for ts in self._tss:
-                times, values = ts.create_observations(from_time, to_time)
-                ts_data.append((ts, times, values, oldest_time))
-
-            # add the time series to each backend
-            for sbe in self._storage_backends:
-                start_secs = common.now_secs()
-                for td in ts_data:
-                    sbe.add_obs(td[0], td[1], td[2], td[3])
-                self._reg_stats(
-                    sbe,
-                    "total secs (extra secs = {})".format(extra_secs),
-                    common.elapsed_secs(start_secs),
-                )
+            # each number of workers adds its own new observations, so that the runs do the same work
+            for nworkers in self._concurrency:
+                # add new observations to each time series in interval
+                # [curr_time, curr_time + extra_secs])
+                ts_data = []
+                from_time, to_time = curr_time, curr_time + extra_secs
+                oldest_time = to_time - self._config["max_age"]  # remove oldest observations
+                for ts in self._tss:
+                    times, values = ts.create_observations(from_time, to_time)
+                    ts_data.append((ts, times, values, oldest_time))
 
-            curr_time += extra_secs
+                # add the time series to each backend
+                ops = [lambda sbe, td=td: sbe.add_obs(td[0], td[1], td[2], td[3]) for td in ts_data]
+                for sbe in self._storage_backends:
+                    self._exec_concurrently(sbe, ops, nworkers, "extra secs = {}, ".format(extra_secs))
+
+                curr_time += extra_secs
 
 
 class GetObsAll(TestBase):
@@ -127,12 +152,14 @@ class GetObsAll(TestBase):
         # retrieve all observations for all time series in time range
         # [curr_time - max_age, curr_time]
 
-        # retrieve from each backend
+        # retrieve from each backend, once per worker
         from_time, to_time = self._curr_time - self._config["max_age"], self._curr_time
         for sbe in self._storage_backends:
-            start_secs = common.now_secs()
-            sbe.get_obs_all(from_time, to_time)  # don't use return value
-            self._reg_stats(sbe, "total secs", common.elapsed_secs(start_secs))
+            for nworkers in self._concurrency:
+                # don't use return value
+                self._exec_concurrently(
+                    sbe, [lambda sbe: sbe.get_obs_all(from_time, to_time)], nworkers, per_worker=True
+                )
 
 
 class GetObsInCircle(TestBase):
@@ -151,13 +178,15 @@ class GetObsInCircle(TestBase):
         lat, lon = 0, 0  # centre of self._config['bbox'] ?
         radius = 0  # distance in km (50% of self._config['bbox'] min. width ?)
 
-        # retrieve from each backend
-        from_time, to_time = self._curr_time - self._config["max_age"], self._curr_time
-        for sbe in self._storage_backends:
-            start_secs = common.now_secs()
+        def get_obs_in_circle(sbe):
             ts_ids = sbe.get_ts_ids_in_circle(lat, lon, radius)
             sbe.get_obs(ts_ids, from_time, to_time)  # don't use return value
-            self._reg_stats(sbe, "total secs", common.elapsed_secs(start_secs))
+
+        # retrieve from each backend, once per worker
+        from_time, to_time = self._curr_time - self._config["max_age"], self._curr_time
+        for sbe in self._storage_backends:
+            for nworkers in self._concurrency:
+                self._exec_concurrently(sbe, [get_obs_in_circle], nworkers, per_worker=True)
 
 
 class TsTester: